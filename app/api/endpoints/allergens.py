@@ -1,28 +1,43 @@
-from fastapi import APIRouter, Depends
+import copy
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
-from app.models.schemas import TextInput
+from app.core.config import ALLERGEN_BATCH_MAX_TEXTS, ALLERGEN_MICRO_BATCHING
+from app.models.schemas import TextBatchInput, TextInput
 from app.services.allergen_detector import AllergenDetector
+from app.services.detect_batcher import DetectBatcher
+from app.services.single_flight import SingleFlight
 from app.api.deps import get_current_user_optional
 from app.models.user import User
 
 router = APIRouter()
 detector = AllergenDetector()
+# Identical texts being checked at the same time share one model run
+detect_flights = SingleFlight()
+# Different texts being checked at the same time are scored as one batch
+detect_batcher = DetectBatcher(detector) if ALLERGEN_MICRO_BATCHING else None
 
-@router.post("/detect")
-def detect_allergens(
-    input_data: TextInput,
-    current_user: Optional[User] = Depends(get_current_user_optional)
-):
-    """Detect allergens in text and mark user's known allergies"""
-    result = detector.detect(input_data.text)
-    
+async def _detect(text: str) -> dict:
+    if detect_batcher is not None:
+        return await detect_batcher.detect(text)
+    # Model inference is CPU-bound, keep it off the event loop
+    return await run_in_threadpool(detector.detect, text)
+
+async def detect_text(text: str) -> dict:
+    """Detect allergens in text off the event loop, sharing the run with concurrent calls"""
+    result = await detect_flights.run(text, lambda: _detect(text))
+    # Callers mark the allergens for their own user, so each gets a copy
+    return copy.deepcopy(result)
+
+def mark_user_allergens(allergens: List[dict], current_user: Optional[User]) -> List[dict]:
+    """Set `is_user_allergen` on each detected allergen from the user's known allergies"""
     # If user is logged in and has allergies, mark matching allergens
     if current_user and hasattr(current_user, 'allergies') and current_user.allergies:
         user_allergies = current_user.allergies
         user_allergy_ids = [allergy.get("id", "").lower() for allergy in user_allergies if isinstance(allergy, dict) and "id" in allergy]
         
         # Mark allergens that match user's known allergies
-        for allergen in result["allergens"]:
+        for allergen in allergens:
             allergen_normalized = allergen["allergen"].lower().replace(" ", "_")
             if allergen_normalized in user_allergy_ids or any(aid in allergen_normalized for aid in user_allergy_ids):
                 allergen["is_user_allergen"] = True
@@ -30,7 +45,42 @@ def detect_allergens(
                 allergen["is_user_allergen"] = False
     else:
         # If no user or no allergies, mark all as not user allergens
-        for allergen in result["allergens"]:
+        for allergen in allergens:
             allergen["is_user_allergen"] = False
     
-    return result 
\ No newline at end of file
+    return allergens
+
+@router.post("/detect")
+async def detect_allergens(
+    input_data: TextInput,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Detect allergens in text and mark user's known allergies"""
+    result = await detect_text(input_data.text)
+    mark_user_allergens(result["allergens"], current_user)
+    return result
+
+@router.post("/detect/batch")
+async def detect_allergens_batch(
+    input_data: TextBatchInput,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Detect allergens in several texts with one model run (offline re-scoring, client sync)"""
+    if len(input_data.texts) > ALLERGEN_BATCH_MAX_TEXTS:
+        raise HTTPException(400, f"At most {ALLERGEN_BATCH_MAX_TEXTS} texts per batch")
+
+    # Model inference is CPU-bound, keep it off the event loop
+    results = await run_in_threadpool(detector.detect_many, input_data.texts)
+    for result in results:
+        mark_user_allergens(result["allergens"], current_user)
+    return {"results": results}
+
+@router.get("/stats")
+async def allergen_stats():
+    """Result cache, request coalescing and micro-batching statistics for allergen detection"""
+    return {
+        "cache": detector.cache.stats(),
+        "coalescing": detect_flights.stats(),
+        "batching": detect_batcher.stats() if detect_batcher is not None else None
+    }
+
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Annotated, Any, AsyncIterator, Dict, List, Literal, Optional
 from datetime import datetime
 
+from app.core.config import OCR_DEFAULT_PROFILE
 from app.core.database import get_db
 from app.models.schemas import MedicineCreate, MedicineUpdate, MedicineResponse
 from app.models.medicine import Medicine
 from app.api.deps import get_current_active_user
+from app.api.endpoints.allergens import detect_text, mark_user_allergens
+from app.api.endpoints.ocr import read_image_upload, stream_response
 from app.models.user import User
+from app.services.ocr_scheduler import ProfileName
+from app.services.ocr_service import stream_pages
 
 router = APIRouter()
 
@@ -115,4 +120,35 @@ def delete_medicine(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/leaflet/scan")
+async def scan_leaflet(
+    file: Annotated[UploadFile, File()],
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE,
+    format: Literal["ndjson", "sse"] = "ndjson",
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Read a medicine package insert (a multi-page TIFF, or any image) and
+    check it for allergens. Streams a "page" event as each page is read,
+    then a "result" event with the full text and the allergens found,
+    marked against the user's known allergies.
+    """
+    contents = await read_image_upload(file)
+
+    async def events() -> AsyncIterator[Dict[str, Any]]:
+        async for event in stream_pages(contents, dpi, language, psm, profile):
+            if event["event"] == "result":
+                allergens: List[dict] = []
+                if event["success"]:
+                    result = await detect_text(event["text"])
+                    allergens = result["allergens"]
+                event = {**event, "allergens": mark_user_allergens(allergens, current_user)}
+            yield event
+
+    return stream_response(events(), format)
+
@@ -1,191 +1,220 @@
+import json
 import logging
-import cv2
-import numpy as np
-import pytesseract
-import re
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from typing import Annotated, Optional, List
+from fastapi import APIRouter, File, Response, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Any, AsyncIterator, Dict, List, Literal, Optional
+
+from app.core.config import OCR_BATCH_MAX_FILES, OCR_DEFAULT_PROFILE, OCR_MAX_UPLOAD_BYTES
+from app.services.ocr_cache import ocr_cache
+from app.services.ocr_memory import memory_budget, memory_stats
+from app.services.ocr_scheduler import ProfileName, variant_stats
+from app.services.ocr_service import (
+    ImageTooLargeError,
+    InvalidImageError,
+    OCRBusyError,
+    extract_text,
+    extract_texts,
+    image_size,
+    ocr_flights,
+    stream_pages,
+    stream_text
+)
+from app.services.ocr_timing import StageTimer, request_timing, stage_histograms
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def correct_orientation(image: np.ndarray) -> np.ndarray:
-    """Detect and correct text orientation"""
+async def read_image_upload(file: UploadFile) -> bytes:
+    """Validate an image upload and return its bytes"""
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(400, "Invalid file type")
+
+    # The body has already been received (BodySizeLimitMiddleware bounds
+    # that), but a huge file isn't copied into memory as well
+    if file.size is not None and file.size > OCR_MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"File too large (limit {OCR_MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(400, "Empty file received")
+    return contents
+
+def check_image_size(contents: bytes) -> None:
+    """Refuse an oversized image with the same 413 as /ocr.
+
+    Streams send their 200 status before any OCR runs, so they check the
+    image header up front instead of reporting this as an "error" event.
+    """
     try:
-        osd = pytesseract.image_to_osd(image)
-        angle = int(re.search(r'Rotate: (\d+)', osd).group(1))
-        if angle != 0:
-            h, w = image.shape[:2]
-            center = (w // 2, h // 2)
-            M = cv2.getRotationMatrix2D(center, angle, 1.0)
-            return cv2.warpAffine(image, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
-    except Exception as e:
-        logger.warning(f"Orientation detection failed: {str(e)}")
-    return image
-
-def enhance_image(image: np.ndarray) -> np.ndarray:
-    """Enhance image resolution if needed"""
-    h, w = image.shape[:2]
-    min_dim = 1800  # Minimum dimension for good OCR results
-    
-    if max(h, w) < min_dim:
-        scale_factor = min_dim / max(h, w)
-        return cv2.resize(image, None, fx=scale_factor, fy=scale_factor, 
-                          interpolation=cv2.INTER_CUBIC)
-    return image
-
-def create_processed_variants(image: np.ndarray) -> List[np.ndarray]:
-    """Create multiple processed versions of the image for best OCR results"""
-    variants = []
-    
-    # Convert to grayscale
-    if len(image.shape) > 2:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = image.copy()
-    
-    # Add original grayscale
-    variants.append(gray)
-    
-    # Add denoised version
-    denoised = cv2.fastNlMeansDenoising(gray, None, h=10, searchWindowSize=21, templateWindowSize=7)
-    variants.append(denoised)
-    
-    # Add sharpened version
-    kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-    sharpened = cv2.filter2D(denoised, -1, kernel)
-    variants.append(sharpened)
-    
-    # Add binary versions with different thresholds
-    # 1. Otsu threshold
-    _, otsu = cv2.threshold(sharpened, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    variants.append(otsu)
-    
-    # 2. Adaptive threshold
-    adaptive = cv2.adaptiveThreshold(
-        denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-    )
-    variants.append(adaptive)
-    
-    # 3. Inverted version of thresholds to handle white-on-black text
-    variants.append(cv2.bitwise_not(otsu))
-    variants.append(cv2.bitwise_not(adaptive))
-    
-    return variants
-
-def clean_text(text: str) -> str:
-    """Clean and normalize OCR output text"""
-    # Remove excessive whitespace
-    cleaned = re.sub(r'\s+', ' ', text).strip()
-    
-    # Fix common OCR errors
-    cleaned = re.sub(r'l\b', 'i', cleaned)  # Fix 'l' at end of words to 'i'
-    cleaned = re.sub(r'O', '0', cleaned)    # Fix 'O' to '0' in numbers
-    cleaned = re.sub(r'(\d),(\d)', r'\1.\2', cleaned)  # Fix comma to decimal in numbers
-    
-    # Fix spacing around punctuation
-    cleaned = re.sub(r'\s+([,.;:)])', r'\1', cleaned)
-    cleaned = re.sub(r'([([])\s+', r'\1', cleaned)
-    
-    # Fix sentence boundaries
-    cleaned = re.sub(r'([a-z])\.([A-Z])', r'\1. \2', cleaned)
-    
-    return cleaned
+        image_size(contents)
+    except ImageTooLargeError as e:
+        raise HTTPException(413, str(e))
+
+def busy_error(e: OCRBusyError) -> HTTPException:
+    return HTTPException(503, str(e), headers={"Retry-After": "5"})
+
+def add_server_timing(response: Response, timer: Optional[StageTimer]) -> None:
+    """Report the request's OCR stage timings, when timing is enabled"""
+    if timer is not None:
+        response.headers["Server-Timing"] = timer.server_timing()
 
 @router.post("/ocr")
 async def high_quality_ocr(
     file: Annotated[UploadFile, File()],
+    response: Response,
     dpi: int = 300,
     language: str = "eng",
-    psm: Optional[int] = None
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
 ):
     """
     High-reliability OCR endpoint that returns clean text for further processing
     """
     try:
-        # Validate input
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(400, "Invalid file type")
-                
-        contents = await file.read()
-        if not contents:
-            raise HTTPException(400, "Empty file received")
-        
-        # Decode image
-        np_array = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
-        if image is None:
-            raise HTTPException(400, "Invalid image format")
-        
-        # Step 1: Correct orientation
-        corrected = correct_orientation(image)
-        
-        # Step 2: Enhance resolution
-        enhanced = enhance_image(corrected)
-        
-        # Step 3: Create multiple processing variants
-        variants = create_processed_variants(enhanced)
-        
-        # Auto-select PSM if not provided
-        if psm is None:
-            h, w = enhanced.shape[:2]
-            if max(h, w) > 1200:  # Larger images likely have multiple text blocks
-                psm = 3  # Multiple columns/paragraphs
-            elif h < 200 or w / h > 5:  # Very narrow image likely a single line
-                psm = 7  # Single text line
-            else:
-                psm = 11  # Sparse text
-        
-        # Set up Tesseract config with properly escaped whitelist
-        custom_config = (
-            f"--dpi {dpi} "
-            f"--psm {psm} "
-            "--oem 3 "
-            f"-l {language} "
-            "-c tessedit_char_whitelist=\"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-.,;:/%'\\\"!?()[]{}@#$^&*_+=<>|° \""
-        )
-        
-        # Try all variants and collect results
-        all_texts = []
-        for variant in variants:
-            text = pytesseract.image_to_string(variant, config=custom_config).strip()
-            if text:
-                all_texts.append(text)
-        
-        # If no text was found in any variant
-        if not all_texts:
-            return {"text": "", "success": False, "message": "No text detected in image"}
-        
-        # Get the longest text (usually the most complete)
-        longest_text = max(all_texts, key=len)
-        
-        # Clean up the text
-        cleaned_text = clean_text(longest_text)
-        
-        # Check if the text is substantially different from other variants
-        # If so, use a voting mechanism to get the most likely correct text
-        if len(all_texts) > 1:
-            words = {}
-            for text in all_texts:
-                for word in re.findall(r'\b\w+\b', text.lower()):
-                    if len(word) > 2:  # Only count words with 3+ characters
-                        words[word] = words.get(word, 0) + 1
-            
-            # If the longest text is missing many common words, combine texts
-            common_words = {word for word, count in words.items() if count > 1}
-            longest_words = set(re.findall(r'\b\w+\b', longest_text.lower()))
-            
-            if len(common_words) > 0 and len(common_words - longest_words) > len(common_words) * 0.3:
-                # Combine all texts and clean
-                combined_text = ' '.join(all_texts)
-                cleaned_text = clean_text(combined_text)
-        
-        return {"text": cleaned_text, "success": True}
-        
+        contents = await read_image_upload(file)
+        with request_timing() as timer:
+            result = await extract_text(contents, dpi, language, psm, profile)
+        add_server_timing(response, timer)
+        return result
+
     except HTTPException:
         raise
+    except ImageTooLargeError as e:
+        raise HTTPException(413, str(e))
+    except InvalidImageError as e:
+        raise HTTPException(400, str(e))
+    except OCRBusyError as e:
+        raise busy_error(e)
     except Exception as e:
         logger.error(f"OCR Error: {str(e)}", exc_info=True)
-        raise HTTPException(500, f"Processing error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
+def format_event(event: Dict[str, Any], fmt: str) -> str:
+    if fmt == "sse":
+        name = event["event"]
+        data = {key: value for key, value in event.items() if key != "event"}
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps(event) + "\n"
+
+def stream_response(events: AsyncIterator[Dict[str, Any]], fmt: str) -> StreamingResponse:
+    """Stream OCR progress events as NDJSON lines or server-sent events"""
+    async def body() -> AsyncIterator[str]:
+        # Once streaming has started errors can't change the status code,
+        # so they are reported as a final "error" event. Headers are sent
+        # before any OCR runs, so stage timings only reach /ocr/stats.
+        try:
+            with request_timing():
+                async for event in events:
+                    yield format_event(event, fmt)
+        except (InvalidImageError, OCRBusyError) as e:
+            yield format_event({"event": "error", "message": str(e)}, fmt)
+        except Exception as e:
+            logger.error(f"OCR Error: {str(e)}", exc_info=True)
+            yield format_event({"event": "error", "message": f"Processing error: {str(e)}"}, fmt)
+
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@router.post("/ocr/stream")
+async def stream_ocr(
+    file: Annotated[UploadFile, File()],
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE,
+    format: Literal["ndjson", "sse"] = "ndjson"
+):
+    """
+    OCR with progress: streams decoded, orientation, enhanced and per-variant
+    events as NDJSON lines or server-sent events, ending with a "result"
+    event. Disconnecting stops the remaining OCR work.
+    """
+    contents = await read_image_upload(file)
+    check_image_size(contents)
+    return stream_response(stream_text(contents, dpi, language, psm, profile), format)
+
+@router.post("/ocr/pages")
+async def ocr_pages(
+    file: Annotated[UploadFile, File()],
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE,
+    format: Literal["ndjson", "sse"] = "ndjson"
+):
+    """
+    OCR every page of a multi-page TIFF or multi-frame image (such as a
+    scanned medicine leaflet), reading pages concurrently. Streams a
+    "page" event as each page finishes and a final "result" event with
+    the text of all pages in order.
+    """
+    contents = await read_image_upload(file)
+    return stream_response(stream_pages(contents, dpi, language, psm, profile), format)
+
+@router.post("/ocr/batch")
+async def batch_ocr(
+    files: Annotated[List[UploadFile], File()],
+    response: Response,
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
+):
+    """
+    OCR several photos of one product (front, back, side panel) in one
+    request, returning each image's text and the merged text
+    """
+    if len(files) > OCR_BATCH_MAX_FILES:
+        raise HTTPException(400, f"At most {OCR_BATCH_MAX_FILES} files per batch")
+
+    # A bad file fails only its own entry, not the whole batch
+    results: List[dict] = []
+    uploads = []
+    for file in files:
+        try:
+            uploads.append(await read_image_upload(file))
+            results.append(None)
+        except HTTPException as e:
+            results.append({"filename": file.filename, "text": "", "success": False, "message": e.detail})
+
+    try:
+        with request_timing() as timer:
+            texts = iter(await extract_texts(uploads, dpi, language, psm, profile))
+        add_server_timing(response, timer)
+    except OCRBusyError as e:
+        raise busy_error(e)
+    except Exception as e:
+        logger.error(f"Batch OCR Error: {str(e)}", exc_info=True)
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
+    for i, file in enumerate(files):
+        if results[i] is not None:
+            continue
+        result = next(texts)
+        if isinstance(result, InvalidImageError):
+            result = {"text": "", "success": False, "message": str(result)}
+        elif isinstance(result, Exception):
+            logger.error(f"OCR Error in {file.filename}: {str(result)}", exc_info=result)
+            result = {"text": "", "success": False, "message": f"Processing error: {str(result)}"}
+        results[i] = {"filename": file.filename, **result}
+
+    # The same panel photographed twice shouldn't be repeated in the merged text
+    merged = list(dict.fromkeys(result["text"] for result in results if result["success"]))
+    return {
+        "results": results,
+        "text": " ".join(merged),
+        "success": bool(merged)
+    }
+
+@router.get("/ocr/stats")
+async def ocr_stats():
+    """OCR result cache and request coalescing counters, per-variant yield, per-stage timing and memory statistics"""
+    return {
+        "cache": ocr_cache.stats(),
+        "coalescing": ocr_flights.stats(),
+        "variants": variant_stats.snapshot(),
+        "timings": stage_histograms.snapshot(),
+        "memory": {**memory_stats.snapshot(), "budget": memory_budget.stats()}
+    }
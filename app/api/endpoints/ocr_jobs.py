@@ -0,0 +1,52 @@
+from fastapi import APIRouter, File, UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from typing import Annotated, Optional
+
+from app.api.endpoints.ocr import read_image_upload
+from app.core.config import OCR_DEFAULT_PROFILE
+from app.services.ocr_job_queue import FAILED, SUCCEEDED, QueueFullError, get_job_queue
+from app.services.ocr_scheduler import ProfileName
+
+router = APIRouter()
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+async def submit_ocr_job(
+    file: Annotated[UploadFile, File()],
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
+):
+    """Queue an image for OCR and return its job id immediately"""
+    contents = await read_image_upload(file)
+    params = {"dpi": dpi, "language": language, "psm": psm, "profile": profile}
+    try:
+        job = await run_in_threadpool(get_job_queue().submit, contents, params)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    return job.to_dict()
+
+@router.get("/{job_id}")
+async def get_ocr_job(job_id: str):
+    """Poll a job's status; finished jobs include their result or error"""
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job.to_dict()
+
+@router.get("/{job_id}/result")
+async def get_ocr_job_result(job_id: str):
+    """Fetch a finished job's OCR result (202 while it is still pending)"""
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    if job.status == SUCCEEDED:
+        return job.result
+    if job.status == FAILED:
+        raise HTTPException(status_code=422, detail=job.error)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.to_dict())
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, File, Response, UploadFile, HTTPException, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Annotated, Any, Awaitable, Optional, Tuple
+
+from app.core.config import OCR_DEFAULT_PROFILE, OCR_LIVE_PROFILE, OCR_MAX_UPLOAD_BYTES
+from app.core.database import SessionLocal, get_db
+from app.api.deps import get_current_user_optional
+from app.api.endpoints.allergens import detect_text, mark_user_allergens
+from app.api.endpoints.ocr import add_server_timing, busy_error, read_image_upload
+from app.models.scan_history import ScanHistory
+from app.models.user import User
+from app.services.live_scan import LiveScanSession
+from app.services.ocr_scheduler import ProfileName
+from app.services.ocr_service import ImageTooLargeError, InvalidImageError, OCRBusyError, extract_text
+from app.services.ocr_timing import request_timing, stage
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def save_scan(db: Session, user_id: Optional[int], product_name: Optional[str], text: str, allergens: list) -> int:
+    """Persist a scan history row and return its id"""
+    db_scan = ScanHistory(
+        user_id=user_id,
+        product_name=product_name,
+        input_text=text,
+        allergens=allergens
+    )
+    db.add(db_scan)
+    db.commit()
+    db.refresh(db_scan)
+    return db_scan.id
+
+@router.post("/scan")
+async def scan_product(
+    file: Annotated[UploadFile, File()],
+    response: Response,
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE,
+    save: bool = False,
+    product_name: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    OCR a product photo and detect allergens in one request, marking the
+    user's known allergies and optionally saving the scan to their history
+    """
+    with request_timing() as timer:
+        try:
+            contents = await read_image_upload(file)
+            ocr_result = await extract_text(contents, dpi, language, psm, profile)
+        except HTTPException:
+            raise
+        except ImageTooLargeError as e:
+            raise HTTPException(413, str(e))
+        except InvalidImageError as e:
+            raise HTTPException(400, str(e))
+        except OCRBusyError as e:
+            raise busy_error(e)
+        except Exception as e:
+            logger.error(f"Scan OCR Error: {str(e)}", exc_info=True)
+            raise HTTPException(500, f"Processing error: {str(e)}")
+
+        if ocr_result["success"]:
+            text = ocr_result["text"]
+            with stage("detect"):
+                result = await detect_text(text)
+    add_server_timing(response, timer)
+
+    if not ocr_result["success"]:
+        return {**ocr_result, "allergens": [], "scan_id": None}
+
+    allergens = mark_user_allergens(result["allergens"], current_user)
+
+    scan_id = None
+    if save:
+        try:
+            scan_id = await run_in_threadpool(
+                save_scan, db, current_user.id if current_user else None, product_name, text, allergens
+            )
+        except Exception as e:
+            logger.error(f"Error saving scan history: {str(e)}", exc_info=True)
+            raise HTTPException(500, f"Error creating scan history: {str(e)}")
+
+    return {
+        "text": text,
+        "success": True,
+        "allergens": allergens,
+        "threshold_used": result["threshold_used"],
+        "scan_id": scan_id
+    }
+
+def resolve_user(token: Optional[str]) -> Optional[User]:
+    """The token's user, looked up on a session closed straight after, not held for a whole socket"""
+    db = SessionLocal()
+    try:
+        return get_current_user_optional(db, token)
+    finally:
+        db.close()
+
+@router.websocket("/scan/live")
+async def live_scan(
+    websocket: WebSocket,
+    dpi: int = 300,
+    language: str = "eng",
+    profile: ProfileName = OCR_LIVE_PROFILE,
+    token: Optional[str] = None
+):
+    """
+    Live camera scanning. The client sends low-res frames as binary
+    messages; the server replies with a "text" event for each frame it
+    reads and an "allergens" event whenever a new allergen has shown up
+    steadily. Frames like the last one read are skipped, and frames that
+    arrive while one is being read are dropped for the newest, so a slow
+    read never builds a backlog. Browsers can't set headers on a
+    WebSocket, so the access token is passed as a query parameter.
+    """
+    current_user = await run_in_threadpool(resolve_user, token)
+    await websocket.accept()
+    session = LiveScanSession(detect_text, dpi, language, profile)
+
+    latest: Optional[Tuple[int, bytes]] = None  # newest frame not yet handled
+    frame_ready = asyncio.Event()
+
+    async def receive_frames() -> None:
+        nonlocal latest
+        frame = 0
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                frame += 1
+                latest = frame, message["bytes"]
+                frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+
+    async def until_disconnect(aw: Awaitable[Any]) -> Tuple[bool, Any]:
+        """Await `aw`, or cancel it if the client disconnects first"""
+        task = asyncio.ensure_future(aw)
+        await asyncio.wait({task, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            return False, None
+        return True, task.result()
+
+    try:
+        while True:
+            ok, _ = await until_disconnect(frame_ready.wait())
+            if not ok:
+                break
+            frame_ready.clear()
+            (frame, contents), latest = latest, None
+
+            if len(contents) > OCR_MAX_UPLOAD_BYTES:
+                await websocket.send_json({"event": "error", "frame": frame, "message": "Frame too large"})
+                continue
+            try:
+                ok, events = await until_disconnect(session.process(frame, contents))
+            except (InvalidImageError, OCRBusyError) as e:
+                ok, events = True, [{"event": "error", "frame": frame, "message": str(e)}]
+            except Exception as e:
+                logger.error(f"Live scan Error: {str(e)}", exc_info=True)
+                ok, events = True, [{"event": "error", "frame": frame, "message": f"Processing error: {str(e)}"}]
+            if not ok:
+                break
+
+            for event in events:
+                if event["event"] == "allergens":
+                    event["allergens"] = mark_user_allergens([dict(a) for a in event["allergens"]], current_user)
+                await websocket.send_json(event)
+    finally:
+        receiver.cancel()
+        await asyncio.wait({receiver})
+        if not receiver.cancelled() and receiver.exception() is not None:
+            logger.error("Live scan receive Error", exc_info=receiver.exception())
+        logger.info(f"Live scan ended: {session.frames_read} frames read, {session.frames_skipped} skipped")
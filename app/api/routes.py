@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import allergens, ocr, auth, test, scan_history, medicines
+from app.api.endpoints import allergens, ocr, ocr_jobs, scan, auth, test, scan_history, medicines
 
 router = APIRouter()
 
@@ -13,6 +13,16 @@ router.include_router(
     ocr.router, prefix="", tags=["OCR"]
 ) 
 
+router.include_router(
+    ocr_jobs.router,
+    prefix="/ocr/jobs",
+    tags=["OCR jobs"]
+)
+
+router.include_router(
+    scan.router, prefix="", tags=["scan"]
+)
+
 router.include_router(
     auth.router,
     prefix="/auth",
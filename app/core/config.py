@@ -1,4 +1,5 @@
 from pathlib import Path
+import os
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -9,8 +10,146 @@ DATA_DIR = BASE_DIR / "data"
 MODEL_PATH = MODEL_DIR / "allergen_model.pkl"
 VECTORIZER_PATH = MODEL_DIR / "tfidf_vectorizer.pkl"
 LABEL_BINARIZER_PATH = MODEL_DIR / "label_binarizer.pkl"
+# Array form of the model's forests, written by scripts/compile_forest.py
+COMPILED_FOREST_PATH = MODEL_DIR / "allergen_forest.npz"
 
 # Thresholds
 BASE_THRESHOLD = 0.3
 MAX_THRESHOLD = 0.5
-INGREDIENT_THRESHOLD_FACTOR = 0.01 
\ No newline at end of file
+INGREDIENT_THRESHOLD_FACTOR = 0.01
+
+# Allergen model backend: "compiled" evaluates the forests from flat arrays
+# (see app/services/compiled_forest.py), "sklearn" uses the pickled model
+ALLERGEN_FOREST = os.getenv("ALLERGEN_FOREST", "compiled")
+# Allergen detection cache, keyed by the text with case and spacing
+# normalized, so rescans of popular products skip the model
+ALLERGEN_CACHE_ENABLED = os.getenv("ALLERGEN_CACHE_ENABLED", "true").lower() == "true"
+ALLERGEN_CACHE_MAX_ENTRIES = int(os.getenv("ALLERGEN_CACHE_MAX_ENTRIES", 4096))
+ALLERGEN_CACHE_TTL_SECONDS = float(os.getenv("ALLERGEN_CACHE_TTL_SECONDS", 3600))
+# Most texts accepted by one /allergens/detect/batch request
+ALLERGEN_BATCH_MAX_TEXTS = int(os.getenv("ALLERGEN_BATCH_MAX_TEXTS", 100))
+# Micro-batching: concurrent single-text detections are collected for up to
+# ALLERGEN_BATCH_WAIT_MS or ALLERGEN_BATCH_MAX_SIZE texts and scored together
+ALLERGEN_MICRO_BATCHING = os.getenv("ALLERGEN_MICRO_BATCHING", "false").lower() == "true"
+ALLERGEN_BATCH_WAIT_MS = float(os.getenv("ALLERGEN_BATCH_WAIT_MS", 5))
+ALLERGEN_BATCH_MAX_SIZE = int(os.getenv("ALLERGEN_BATCH_MAX_SIZE", 32))
+
+# OCR execution
+# Cores are shared between the uvicorn workers (WEB_CONCURRENCY), so each
+# worker only gets its share of them for its OCR pool.
+CPU_COUNT = os.cpu_count() or 1
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+OCR_EXECUTOR = os.getenv("OCR_EXECUTOR", "process")  # "process" or "thread"
+OCR_POOL_WORKERS = int(os.getenv("OCR_POOL_WORKERS", max(1, CPU_COUNT // WEB_CONCURRENCY)))
+OCR_MAX_CONCURRENT_REQUESTS = int(os.getenv("OCR_MAX_CONCURRENT_REQUESTS", OCR_POOL_WORKERS))
+
+# Adaptive variant scheduling: stop OCRing further variants once the best
+# reading has at least this mean word confidence (0-100) and word count
+OCR_EARLY_EXIT_CONFIDENCE = float(os.getenv("OCR_EARLY_EXIT_CONFIDENCE", 80))
+OCR_EARLY_EXIT_MIN_WORDS = int(os.getenv("OCR_EARLY_EXIT_MIN_WORDS", 3))
+
+# Quality profile ("fast", "balanced" or "accurate") used when a request
+# doesn't choose one; see OCR_PROFILES in app/services/ocr_scheduler.py
+OCR_DEFAULT_PROFILE = os.getenv("OCR_DEFAULT_PROFILE", "accurate")
+
+# Tesseract backend: "capi" keeps engines loaded in-process through
+# libtesseract, "cli" forks the tesseract binary per call via pytesseract,
+# "auto" uses the C API when the library can be found.
+OCR_TESSERACT_BACKEND = os.getenv("OCR_TESSERACT_BACKEND", "auto")
+TESSERACT_LIBRARY = os.getenv("TESSERACT_LIBRARY")
+TESSDATA_PREFIX = os.getenv("TESSDATA_PREFIX")
+# Languages whose engines are loaded when an OCR worker starts
+OCR_WARM_LANGUAGES = [lang for lang in os.getenv("OCR_WARM_LANGUAGES", "eng").split(",") if lang]
+
+# OCR result cache, keyed by the upload's SHA-256 and by a perceptual hash
+# so near-identical rescans of the same product also hit
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", 1024))
+OCR_CACHE_TTL_SECONDS = float(os.getenv("OCR_CACHE_TTL_SECONDS", 3600))
+# dHash grid size (hash has size*size bits) and the max Hamming distance
+# between two hashes still treated as the same photo
+OCR_CACHE_HASH_SIZE = int(os.getenv("OCR_CACHE_HASH_SIZE", 16))
+OCR_CACHE_HASH_DISTANCE = int(os.getenv("OCR_CACHE_HASH_DISTANCE", 8))
+
+# Upload size limits. Uploads over OCR_MAX_UPLOAD_BYTES or
+# OCR_MAX_IMAGE_PIXELS are refused; larger photos than OCR_MAX_DECODE_PIXELS
+# are decoded at reduced size, bounding each request's image buffers.
+# Request bodies as a whole are cut off at OCR_MAX_REQUEST_BYTES as they
+# arrive (see app/core/middleware.py), before anything is spooled.
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_BYTES", 25 * 1024 * 1024))
+OCR_MAX_IMAGE_PIXELS = int(os.getenv("OCR_MAX_IMAGE_PIXELS", 100_000_000))
+OCR_MAX_DECODE_PIXELS = int(os.getenv("OCR_MAX_DECODE_PIXELS", 12_000_000))
+
+# OCR memory accounting: OCR_MEMORY_TRACKING ("off", "tracemalloc" or "rss")
+# measures each request's peak memory in the OCR workers for /ocr/stats.
+# With OCR_MEMORY_BUDGET_MB set, requests are only admitted while the
+# projected peaks of those in flight fit in it; one that can't get in within
+# OCR_MEMORY_WAIT_SECONDS is refused. Projections start at
+# OCR_MEMORY_BYTES_PER_PIXEL of decoded image and follow the measured peaks.
+OCR_MEMORY_TRACKING = os.getenv("OCR_MEMORY_TRACKING", "off")
+OCR_MEMORY_SAMPLE_INTERVAL = float(os.getenv("OCR_MEMORY_SAMPLE_INTERVAL", 0.005))  # "rss" polling, seconds
+OCR_MEMORY_BUDGET_MB = int(os.getenv("OCR_MEMORY_BUDGET_MB", 0))  # 0: no budget
+OCR_MEMORY_WAIT_SECONDS = float(os.getenv("OCR_MEMORY_WAIT_SECONDS", 10))
+OCR_MEMORY_BYTES_PER_PIXEL = float(os.getenv("OCR_MEMORY_BYTES_PER_PIXEL", 8))
+
+# Orientation: uploads whose text already looks upright on a copy this size
+# skip OSD; the rest run OSD on a copy no larger than OCR_OSD_MAX_SIDE
+OCR_ORIENTATION_CHECK_SIDE = int(os.getenv("OCR_ORIENTATION_CHECK_SIDE", 1200))
+OCR_OSD_MAX_SIDE = int(os.getenv("OCR_OSD_MAX_SIDE", 2400))
+OCR_OSD_MIN_CONFIDENCE = float(os.getenv("OCR_OSD_MIN_CONFIDENCE", 5.0))
+
+# Text-region cropping: find the text block(s) on a low-res copy and only
+# enhance/OCR those, unless there are more than OCR_REGION_MAX_BLOCKS of
+# them or they cover most of the frame anyway
+OCR_REGION_CROP = os.getenv("OCR_REGION_CROP", "true").lower() == "true"
+OCR_REGION_DETECT_SIDE = int(os.getenv("OCR_REGION_DETECT_SIDE", 800))
+OCR_REGION_MAX_BLOCKS = int(os.getenv("OCR_REGION_MAX_BLOCKS", 3))
+OCR_REGION_MAX_COVERAGE = float(os.getenv("OCR_REGION_MAX_COVERAGE", 0.6))
+
+# Tiled OCR: enhanced text blocks of at least OCR_TILE_MIN_PIXELS are split
+# into up to one tile per OCR pool worker (tiles no smaller than
+# OCR_TILE_MIN_SIDE), read in parallel and stitched back together. Cuts
+# that have to cross text overlap by OCR_TILE_OVERLAP pixels.
+OCR_TILING = os.getenv("OCR_TILING", "true").lower() == "true"
+OCR_TILE_MIN_PIXELS = int(os.getenv("OCR_TILE_MIN_PIXELS", 4_000_000))
+OCR_TILE_MIN_SIDE = int(os.getenv("OCR_TILE_MIN_SIDE", 600))
+OCR_TILE_OVERLAP = int(os.getenv("OCR_TILE_OVERLAP", 80))
+
+# Live camera scanning (/scan/live): a frame whose perceptual hash is within
+# OCR_LIVE_SKIP_DISTANCE bits of the last frame read isn't OCR'd again, and
+# an allergen is reported once OCR_LIVE_STABLE_FRAMES frames in a row show it
+OCR_LIVE_PROFILE = os.getenv("OCR_LIVE_PROFILE", "fast")
+OCR_LIVE_SKIP_DISTANCE = int(os.getenv("OCR_LIVE_SKIP_DISTANCE", 12))
+OCR_LIVE_STABLE_FRAMES = int(os.getenv("OCR_LIVE_STABLE_FRAMES", 2))
+
+# Per-stage OCR timing: Server-Timing headers on OCR responses and stage
+# histograms in /ocr/stats
+OCR_TIMING_ENABLED = os.getenv("OCR_TIMING_ENABLED", "false").lower() == "true"
+
+# Most images accepted by one /ocr/batch request
+OCR_BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", 10))
+# Largest request body accepted: a full /ocr/batch plus room for the form
+OCR_MAX_REQUEST_BYTES = int(os.getenv("OCR_MAX_REQUEST_BYTES", OCR_BATCH_MAX_FILES * OCR_MAX_UPLOAD_BYTES + 1024 * 1024))
+# Most pages (TIFF pages, animation frames) read from one multi-page upload
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", 50))
+# Pages of one document read at the same time, so a long document neither
+# holds every page at once nor takes every OCR slot from other requests
+OCR_MAX_CONCURRENT_PAGES = int(os.getenv("OCR_MAX_CONCURRENT_PAGES", max(1, OCR_POOL_WORKERS // 2)))
+
+# Asynchronous OCR jobs: "sqlite" queues jobs in a local SQLite file shared
+# with separate worker processes (scripts/ocr_worker.py); "memory" keeps
+# them in the API process and runs the workers there too. Unless
+# OCR_JOB_EXTERNAL_WORKERS says scripts/ocr_worker.py is deployed, the API
+# process always runs at least one worker itself, so jobs never sit queued
+# with nobody to claim them.
+OCR_JOB_BACKEND = os.getenv("OCR_JOB_BACKEND", "sqlite")
+OCR_JOB_DB_PATH = os.getenv("OCR_JOB_DB_PATH", str(BASE_DIR / "ocr_jobs.db"))
+OCR_JOB_MAX_DEPTH = int(os.getenv("OCR_JOB_MAX_DEPTH", 100))  # queued + running
+OCR_JOB_MAX_ATTEMPTS = int(os.getenv("OCR_JOB_MAX_ATTEMPTS", 3))
+OCR_JOB_LEASE_SECONDS = float(os.getenv("OCR_JOB_LEASE_SECONDS", 120))  # before a stuck job is retried
+OCR_JOB_RESULT_TTL_SECONDS = float(os.getenv("OCR_JOB_RESULT_TTL_SECONDS", 3600))
+# Jobs refused by the OCR memory budget go back in the queue for this long,
+# without using up an attempt
+OCR_JOB_DEFER_SECONDS = float(os.getenv("OCR_JOB_DEFER_SECONDS", 15))
+OCR_JOB_EXTERNAL_WORKERS = os.getenv("OCR_JOB_EXTERNAL_WORKERS", "false").lower() == "true"
+OCR_JOB_INPROCESS_WORKERS = int(os.getenv("OCR_JOB_INPROCESS_WORKERS", 0))
@@ -0,0 +1,52 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from app.core.config import OCR_MAX_REQUEST_BYTES
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+class BodySizeLimitMiddleware:
+    """Refuses HTTP request bodies over `max_bytes` with 413 before they are read.
+
+    A Content-Length over the limit is refused without reading anything;
+    bodies sent without one (chunked) are counted as they arrive and cut
+    off once they pass the limit. Form parsing only spools what got past
+    here, so an oversized upload never reaches memory or disk whole.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]], max_bytes: int = OCR_MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self) -> str:
+        return f"Request too large (limit {self.max_bytes // (1024 * 1024)} MB)"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({"detail": self._too_large()}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing, which passes HTTPExceptions through
+                    raise HTTPException(413, self._too_large())
+            return message
+
+        await self.app(scope, limited_receive, send)
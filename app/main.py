@@ -1,7 +1,11 @@
 from fastapi import FastAPI
 from app.api.routes import router
+from app.api.endpoints.allergens import detect_batcher
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.database import Base, engine
+from app.core.middleware import BodySizeLimitMiddleware
+from app.services.ocr_executor import ocr_executor
+from app.services.ocr_job_queue import start_inprocess_workers, stop_inprocess_workers
 from dotenv import load_dotenv
 import os
 
@@ -22,5 +26,19 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
 )
+# Oversized uploads are refused before they are read
+app.add_middleware(BodySizeLimitMiddleware)
 
-app.include_router(router) 
\ No newline at end of file
+app.include_router(router)
+
+@app.on_event("startup")
+async def start_ocr_pool():
+    ocr_executor.start()
+    start_inprocess_workers()
+
+@app.on_event("shutdown")
+async def stop_ocr_pool():
+    await stop_inprocess_workers()
+    if detect_batcher is not None:
+        await detect_batcher.stop()
+    ocr_executor.shutdown()
@@ -5,10 +5,14 @@ from datetime import datetime
 class TextInput(BaseModel):
     text: str
 
+class TextBatchInput(BaseModel):
+    texts: list[str]
+
 class AllergenPrediction(BaseModel):
     allergen: str
     confidence: float
     evidence: list[str] | None
+    evidence_spans: list[tuple[int, int]] | None = None  # [start, end) of each evidence item in the input text
     is_user_allergen: Optional[bool] = None
 
 class AllergenResponse(BaseModel):
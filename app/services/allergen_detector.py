@@ -1,52 +1,125 @@
+import copy
+import logging
 import joblib
-from app.core.config import MODEL_PATH, VECTORIZER_PATH, LABEL_BINARIZER_PATH
-from app.core.constants import INGREDIENTS
-from app.utils.text_processing import get_evidence
+from app.core.config import (
+    ALLERGEN_FOREST,
+    COMPILED_FOREST_PATH,
+    LABEL_BINARIZER_PATH,
+    MODEL_PATH,
+    VECTORIZER_PATH
+)
+from app.services.compiled_forest import CompiledForest
+from app.services.detection_cache import DetectionCache, normalize_text
+from app.utils.term_matcher import ingredient_matcher
+from app.utils.text_processing import Evidence, extract_evidence
+
+def evidence_fields(evidence: list[Evidence]) -> dict:
+    # Spans let clients highlight the evidence in the text they sent
+    return {
+        "evidence": [e.text for e in evidence],
+        "evidence_spans": [[e.start, e.end] for e in evidence]
+    }
+
+logger = logging.getLogger(__name__)
+
+def load_model(backend: str = ALLERGEN_FOREST):
+    """The allergen model, or its compiled forests, which predict the same far faster in less memory"""
+    if backend == "sklearn":
+        return joblib.load(MODEL_PATH)
+    compiled = COMPILED_FOREST_PATH
+    if compiled.exists() and compiled.stat().st_mtime >= MODEL_PATH.stat().st_mtime:
+        return CompiledForest.load(compiled)
+    # No up-to-date compiled copy: compile the pickled model now
+    logger.warning(f"{compiled.name} is missing or older than the model, compiling it at startup")
+    return CompiledForest.compile(joblib.load(MODEL_PATH))
 
 class AllergenDetector:
     def __init__(self):
-        self.model = joblib.load(MODEL_PATH)
+        self.model = load_model()
         self.tfidf = joblib.load(VECTORIZER_PATH)
         self.mlb = joblib.load(LABEL_BINARIZER_PATH)
+        self.cache = DetectionCache()
         
         # Adjusted thresholds - lowered for better detection of direct ingredients
         self.primary_threshold = 0.35    # For direct ingredients
         self.secondary_threshold = 0.25   # For "may contain" statements
 
     def detect(self, text: str) -> dict:
-        X = self.tfidf.transform([text])
-        predictions_proba = self.model.predict_proba(X)
-        
+        return self.detect_many([text])[0]
+
+    def detect_many(self, texts: list[str]) -> list[dict]:
+        """Detect allergens in several texts with one model run.
+
+        The texts are vectorized into one matrix and each label's forest
+        scores all of them in a single call, so a batch costs little more
+        than one text. Texts already in the cache (up to case and spacing)
+        skip the model.
+        """
+        # The model sees normalized text, so every spelling the cache
+        # treats as the same text also scores the same
+        normalized = [normalize_text(text) for text in texts]
+        # The cache only lives as long as this detector and its model, so
+        # only the thresholds can change what a text's result should be
+        version = f"{self.primary_threshold}:{self.secondary_threshold}"
+        keys = [self.cache.key(n, version) for n in normalized]
+
+        results: list[dict | None] = []
+        misses = []
+        for i, (text, key) in enumerate(zip(texts, keys)):
+            cached = self.cache.get(key, text)
+            if cached is None:
+                results.append(None)
+                misses.append(i)
+            elif cached.text == text:
+                results.append(copy.deepcopy(cached.result))
+            else:
+                results.append(self._detect_one(text, cached.label_probs))
+
+        if misses:
+            X = self.tfidf.transform([normalized[i] for i in misses])
+            predictions_proba = self.model.predict_proba(X)
+            for row, i in enumerate(misses):
+                label_probs = [float(label_proba[row][1]) for label_proba in predictions_proba]
+                results[i] = self._detect_one(texts[i], label_probs)
+                self.cache.put(keys[i], label_probs, texts[i], results[i])
+        return results
+
+    def _detect_one(self, text: str, label_probs: list[float]) -> dict:
         # Use instance thresholds
         primary_threshold = self.primary_threshold
         secondary_threshold = self.secondary_threshold
         
+        # Every category named directly in the text, found in one scan, and
+        # the evidence for all categories from one parse
+        named = ingredient_matcher.labels_in(text)
+        evidence_by_label = extract_evidence(text)
+        
         allergen_predictions = []
         for idx, label in enumerate(self.mlb.classes_):
             if not label:
                 continue
                 
-            prob = predictions_proba[idx][0][1]
-            evidence = get_evidence(text, label)
+            prob = label_probs[idx]
+            evidence = evidence_by_label.get(label)
             
             if evidence:
                 # Direct ingredients or "Contains" statements
-                if any("Contains statement:" in e for e in evidence) or any(term.lower() in text.lower() for term in INGREDIENTS[label]):
+                if any("Contains statement:" in e.text for e in evidence) or label in named:
                     # Increase confidence for direct ingredient mentions
                     prob = min(prob * 1.5, 1.0)  # Increased from 1.2 to 1.5
                     if prob >= primary_threshold:
                         allergen_predictions.append({
                             "allergen": label,
                             "confidence": float(prob),
-                            "evidence": evidence
+                            **evidence_fields(evidence)
                         })
                 # "May contain" statements
-                elif any("may contain" in e.lower() or "traces of" in e.lower() for e in evidence):
+                elif any("may contain" in e.text.lower() or "traces of" in e.text.lower() for e in evidence):
                     if prob >= secondary_threshold:
                         allergen_predictions.append({
                             "allergen": label,
                             "confidence": float(prob),
-                            "evidence": evidence
+                            **evidence_fields(evidence)
                         })
         
         return {
@@ -60,24 +133,25 @@ class AllergenDetector:
     def detect_allergens(self, text: str) -> list[dict]:
         allergens = []
         predictions = self.model.predict_proba(self.tfidf.transform([text]))[0]
+        evidence_by_label = extract_evidence(text)
         
         for idx, confidence in enumerate(predictions):
             allergen = self.mlb.classes_[idx]
-            evidence = get_evidence(text, allergen)
+            evidence = evidence_by_label.get(allergen)
             
             # Only include high confidence predictions with evidence
             if evidence and confidence >= self.primary_threshold:
                 allergens.append({
                     "allergen": allergen,
                     "confidence": float(confidence),
-                    "evidence": evidence
+                    **evidence_fields(evidence)
                 })
             # Include lower confidence predictions only for "may contain" statements
-            elif evidence and "may contain" in str(evidence).lower() and confidence >= self.secondary_threshold:
+            elif evidence and "may contain" in str([e.text for e in evidence]).lower() and confidence >= self.secondary_threshold:
                 allergens.append({
                     "allergen": allergen,
                     "confidence": float(confidence),
-                    "evidence": evidence
+                    **evidence_fields(evidence)
                 })
                 
         return sorted(allergens, key=lambda x: x["confidence"], reverse=True) 
\ No newline at end of file
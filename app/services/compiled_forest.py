@@ -0,0 +1,118 @@
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+
+class CompiledForest:
+    """A MultiOutputClassifier of binary random forests flattened into arrays.
+
+    Every tree of every label's forest is stored in one set of contiguous
+    node arrays (feature, threshold, children, leaf probability), with
+    features renumbered to just the ones the trees split on. Prediction
+    walks all trees for all rows at once, one NumPy step per tree level,
+    instead of calling into thousands of scikit-learn tree objects, and
+    returns what `predict_proba` would (up to float rounding).
+    """
+
+    def __init__(
+        self,
+        features: np.ndarray,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        leaf_proba: np.ndarray,
+        roots: np.ndarray,
+        label_starts: np.ndarray,
+        depth: int
+    ):
+        self.features = features  # input columns used, in compact order
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children  # left and right child of each node, interleaved
+        self.leaf_proba = leaf_proba  # P(class 1) at each node
+        self.roots = roots
+        self.label_starts = label_starts  # first tree of each label in `roots`
+        self.depth = depth
+
+    @classmethod
+    def compile(cls, model: Any) -> "CompiledForest":
+        """Flatten a fitted MultiOutputClassifier whose estimators are binary (0/1) random forests"""
+        trees, label_starts = [], []
+        for estimator in model.estimators_:
+            if list(estimator.classes_) != [0, 1]:
+                raise ValueError(f"Can only compile binary forests, got classes {list(estimator.classes_)}")
+            label_starts.append(len(trees))
+            trees.extend(tree.tree_ for tree in estimator.estimators_)
+
+        used = np.unique(np.concatenate([tree.feature[tree.children_left >= 0] for tree in trees]))
+        compact = np.zeros(max(used.max() + 1, 1) if used.size else 1, dtype=np.int32)
+        compact[used] = np.arange(used.size, dtype=np.int32)
+
+        feature, threshold, children, leaf_proba, roots = [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            is_leaf = tree.children_left < 0
+            nodes = np.arange(tree.node_count, dtype=np.int32) + offset
+            # Leaves point at themselves, so every row can take `depth` steps
+            feature.append(np.where(is_leaf, 0, compact[np.maximum(tree.feature, 0)]).astype(np.int32))
+            threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+            left = np.where(is_leaf, nodes, tree.children_left + offset)
+            right = np.where(is_leaf, nodes, tree.children_right + offset)
+            children.append(np.column_stack((left, right)).astype(np.int32).ravel())
+            value = tree.value[:, 0, :]
+            leaf_proba.append(value[:, 1] / value.sum(axis=1))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            features=used,
+            feature=np.concatenate(feature),
+            threshold=np.concatenate(threshold),
+            children=np.concatenate(children),
+            leaf_proba=np.concatenate(leaf_proba),
+            roots=np.array(roots, dtype=np.int32),
+            label_starts=np.array(label_starts, dtype=np.int64),
+            depth=max(tree.max_depth for tree in trees)
+        )
+
+    # Rows walked together; bounds the (rows x trees) working arrays to a few MB
+    CHUNK_ROWS = 64
+
+    def predict_proba(self, X: Any) -> List[np.ndarray]:
+        """Per label, an (n_samples, 2) array of class probabilities, like MultiOutputClassifier"""
+        # Trees compare float32 inputs, as scikit-learn does
+        X = X[:, self.features]
+        X = np.asarray(X.toarray() if hasattr(X, "toarray") else X, dtype=np.float32)
+        proba = np.vstack([
+            self._label_proba(X[start:start + self.CHUNK_ROWS])
+            for start in range(0, max(X.shape[0], 1), self.CHUNK_ROWS)
+        ])
+        return [np.column_stack((1 - p, p)) for p in proba.T]
+
+    def _label_proba(self, X: np.ndarray) -> np.ndarray:
+        """P(class 1) of each row (n_samples, n_labels)"""
+        n_samples, n_features = X.shape
+        values = X.ravel()
+        row_starts = (np.arange(n_samples, dtype=np.int64) * n_features)[:, None]
+
+        node = np.broadcast_to(self.roots, (n_samples, self.roots.size))
+        for _ in range(self.depth):
+            go_right = values[row_starts + self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + go_right]
+
+        # Each label's probability is the mean over its trees
+        counts = np.diff(np.append(self.label_starts, self.roots.size))
+        return np.add.reduceat(self.leaf_proba[node], self.label_starts, axis=1) / counts
+
+    ARRAYS = ("features", "feature", "threshold", "children", "leaf_proba", "roots", "label_starts")
+
+    def save(self, path: Path) -> None:
+        np.savez(path, depth=self.depth, **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path: Path) -> "CompiledForest":
+        with np.load(path) as arrays:
+            return cls(depth=int(arrays["depth"]), **{name: arrays[name] for name in cls.ARRAYS})
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import ALLERGEN_BATCH_MAX_SIZE, ALLERGEN_BATCH_WAIT_MS
+from app.services.allergen_detector import AllergenDetector
+from app.services.ocr_timing import StageHistograms
+
+Pending = Tuple[str, asyncio.Future, float]  # text, result, when it was queued
+
+class DetectBatcher:
+    """Runs concurrent single-text detections through the model together.
+
+    A batch opens with the first queued text and closes after `max_wait`
+    seconds or `max_size` texts, then one `detect_many` call scores it and
+    each caller gets its own result. Batches run one at a time, so texts
+    arriving while the model is busy queue up for the next one. If the
+    worker stops (`stop()` at shutdown, or an unexpected error), every
+    caller still waiting on it gets an error rather than hanging.
+    """
+
+    def __init__(
+        self,
+        detector: AllergenDetector,
+        max_wait: float = ALLERGEN_BATCH_WAIT_MS / 1000,
+        max_size: int = ALLERGEN_BATCH_MAX_SIZE
+    ):
+        self.detector = detector
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.waits = StageHistograms()
+
+    async def detect(self, text: str) -> dict:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        result = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, result, time.perf_counter()))
+        return await result
+
+    async def _collect(self, batch: List[Pending]) -> None:
+        """Fill `batch` (the caller's, so nothing taken off the queue is lost if cancelled)"""
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        batch: List[Pending] = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+                # Callers that gave up while queued don't need scoring
+                batch = [pending for pending in batch if not pending[1].done()]
+                if not batch:
+                    continue
+
+                started = time.perf_counter()
+                for _, _, queued in batch:
+                    self.waits.observe("queue_wait", started - queued)
+                self.batches += 1
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+                try:
+                    # Model inference is CPU-bound, keep it off the event loop
+                    results = await run_in_threadpool(self.detector.detect_many, [text for text, _, _ in batch])
+                except Exception as e:
+                    self._fail(batch, e)
+                    continue
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # Nobody is left waiting on a worker that has stopped
+            error = RuntimeError("Allergen detection batcher stopped")
+            self._fail(batch, error)
+            while not self._queue.empty():
+                self._fail([self._queue.get_nowait()], error)
+
+    @staticmethod
+    def _fail(batch: List[Pending], error: Exception) -> None:
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def stop(self) -> None:
+        """Stop the worker, failing any detections still queued"""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.wait({self._worker})
+            self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        texts = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "batches": self.batches,
+            "texts": texts,
+            "mean_batch_size": round(texts / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            **self.waits.snapshot()
+        }
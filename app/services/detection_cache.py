@@ -0,0 +1,105 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from app.core.config import (
+    ALLERGEN_CACHE_ENABLED,
+    ALLERGEN_CACHE_MAX_ENTRIES,
+    ALLERGEN_CACHE_TTL_SECONDS
+)
+
+def normalize_text(text: str) -> str:
+    """Label text with case and whitespace differences removed"""
+    return " ".join(text.lower().split())
+
+class CachedDetection(NamedTuple):
+    label_probs: List[float]  # model scores, shared by every text normalizing the same
+    text: str  # the text `result` was built for
+    result: Dict[str, Any]
+
+class _Entry(NamedTuple):
+    detection: CachedDetection
+    expires_at: float
+
+class DetectionCache:
+    """LRU cache of allergen detections with a TTL.
+
+    Keyed by the SHA-256 of the normalized text plus a version string (the
+    detector's thresholds), so rescans of a product whose text differs only
+    in case or spacing skip the model. The cache belongs to the detector
+    that loaded the model, so it never outlives that model. Evidence and
+    its spans belong to the exact text, so the cached result is only
+    reused for that text; other spellings reuse the model scores and
+    rebuild the (cheap) evidence.
+    Results carry no per-user marking, so entries are shared by all users.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ALLERGEN_CACHE_MAX_ENTRIES,
+        ttl: float = ALLERGEN_CACHE_TTL_SECONDS,
+        enabled: bool = ALLERGEN_CACHE_ENABLED
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.normalized_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(normalized: str, version: str) -> str:
+        return hashlib.sha256(f"{version}\0{normalized}".encode()).hexdigest()
+
+    def get(self, key: str, text: str) -> Optional[CachedDetection]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.detection.text == text:
+                self.hits += 1
+            else:
+                self.normalized_hits += 1
+            return entry.detection
+
+    def put(self, key: str, label_probs: List[float], text: str, result: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        # Callers mark the result for their user, so keep a copy of our own
+        detection = CachedDetection(label_probs, text, copy.deepcopy(result))
+        with self._lock:
+            self._entries[key] = _Entry(detection, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.hits + self.normalized_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "normalized_hits": self.normalized_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,100 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import (
+    OCR_CACHE_HASH_SIZE,
+    OCR_LIVE_PROFILE,
+    OCR_LIVE_SKIP_DISTANCE,
+    OCR_LIVE_STABLE_FRAMES
+)
+from app.services.ocr_executor import ocr_executor
+from app.services.ocr_pipeline import InvalidImageError, image_size, perceptual_hash
+from app.services.ocr_scheduler import ProfileName
+from app.services.ocr_service import extract_text_uncached
+
+class LiveScanSession:
+    """Incremental OCR and allergen detection over one camera stream.
+
+    Each frame is compared with the last frame that was read by perceptual
+    hash; one within `skip_distance` bits shows the same content and is not
+    OCR'd again. An allergen is reported once `stable_frames` frames in a
+    row show it (a skipped frame repeats the previous frame's allergens),
+    so a single misread doesn't flash up, and once reported it stays for
+    the rest of the session as the camera pans across the label.
+
+    `detect` runs allergen detection on a frame's text, so frames share
+    the API's detection path (single-flight, micro-batching and cache).
+    """
+
+    def __init__(
+        self,
+        detect: Callable[[str], Awaitable[dict]],
+        dpi: int = 300,
+        language: str = "eng",
+        profile: ProfileName = OCR_LIVE_PROFILE,
+        skip_distance: int = OCR_LIVE_SKIP_DISTANCE,
+        stable_frames: int = OCR_LIVE_STABLE_FRAMES
+    ):
+        self.detect = detect
+        self.dpi = dpi
+        self.language = language
+        self.profile = profile
+        self.skip_distance = skip_distance
+        self.stable_frames = stable_frames
+        self.frames_read = 0
+        self.frames_skipped = 0
+        self._last_hash: Optional[Tuple[Tuple[int, int], int]] = None
+        self._last_allergens: Dict[str, dict] = {}  # allergens in the last frame read
+        self._streaks: Dict[str, int] = {}
+        self._stable: Dict[str, dict] = {}
+
+    def _unchanged(self, fingerprint: Tuple[Tuple[int, int], int]) -> bool:
+        if self._last_hash is None:
+            return False
+        (h, w), phash = fingerprint
+        (last_h, last_w), last_phash = self._last_hash
+        return (h, w) == (last_h, last_w) and (phash ^ last_phash).bit_count() <= self.skip_distance
+
+    def _update_allergens(self, seen: Dict[str, dict]) -> bool:
+        """Advance the streaks with one frame's allergens; True if any became stable"""
+        self._streaks = {name: self._streaks.get(name, 0) + 1 for name in seen}
+        changed = False
+        for name, streak in self._streaks.items():
+            if streak < self.stable_frames:
+                continue
+            current = self._stable.get(name)
+            if current is None:
+                changed = True
+            if current is None or seen[name]["confidence"] > current["confidence"]:
+                self._stable[name] = seen[name]
+        return changed
+
+    def stable_allergens(self) -> List[dict]:
+        return sorted(self._stable.values(), key=lambda allergen: allergen["confidence"], reverse=True)
+
+    async def process(self, frame: int, contents: bytes) -> List[Dict[str, Any]]:
+        """Handle one frame, returning the events to send for it"""
+        image_size(contents)  # refuse oversized frames before decoding them
+        fingerprint = await ocr_executor.run(perceptual_hash, contents, OCR_CACHE_HASH_SIZE)
+        if fingerprint is None:
+            raise InvalidImageError("Invalid image format")
+
+        if self._unchanged(fingerprint):
+            self.frames_skipped += 1
+            seen = self._last_allergens
+            events = []
+        else:
+            self.frames_read += 1
+            self._last_hash = fingerprint
+            # The frame is already hashed and compared above, so the shared
+            # result cache is neither searched nor filled
+            ocr_result = await extract_text_uncached(contents, self.dpi, self.language, profile=self.profile)
+            seen = {}
+            if ocr_result["success"]:
+                result = await self.detect(ocr_result["text"])
+                seen = {allergen["allergen"]: allergen for allergen in result["allergens"]}
+            self._last_allergens = seen
+            events = [{"event": "text", "frame": frame, **ocr_result}]
+
+        if self._update_allergens(seen):
+            events.append({"event": "allergens", "frame": frame, "allergens": self.stable_allergens()})
+        return events
@@ -0,0 +1,135 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from app.core.config import (
+    OCR_CACHE_ENABLED,
+    OCR_CACHE_MAX_ENTRIES,
+    OCR_CACHE_TTL_SECONDS,
+    OCR_CACHE_HASH_DISTANCE
+)
+
+class _Entry(NamedTuple):
+    params: Hashable
+    size: Optional[Tuple[int, int]]
+    phash: Optional[int]
+    result: Dict[str, Any]
+    expires_at: float
+
+def _same_size(a: Optional[Tuple[int, int]], b: Tuple[int, int]) -> bool:
+    # Hash sizes come from a 1/8-scale decode, which JPEG rounds up and
+    # other formats round down, so allow a pixel of slack
+    return a is not None and abs(a[0] - b[0]) <= 1 and abs(a[1] - b[1]) <= 1
+
+class OCRResultCache:
+    """LRU cache of OCR results with a TTL.
+
+    Entries are looked up by the SHA-256 of the upload bytes plus the OCR
+    params, or failing that by a perceptual hash within `max_distance` bits
+    of a cached one (same params and decoded size), so a recompressed or
+    re-sent photo of the same label also skips OCR.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = OCR_CACHE_MAX_ENTRIES,
+        ttl: float = OCR_CACHE_TTL_SECONDS,
+        max_distance: int = OCR_CACHE_HASH_DISTANCE,
+        enabled: bool = OCR_CACHE_ENABLED
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(contents: bytes) -> str:
+        return hashlib.sha256(contents).hexdigest()
+
+    def _live(self, key: Tuple[str, Hashable], now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, digest: str, params: Hashable) -> Optional[Dict[str, Any]]:
+        """Exact lookup by upload digest"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._live((digest, params), time.monotonic())
+            if entry is not None:
+                self.exact_hits += 1
+                return entry.result
+        return None
+
+    def get_similar(
+        self, size: Tuple[int, int], phash: int, params: Hashable
+    ) -> Optional[Dict[str, Any]]:
+        """Perceptual lookup; counts a miss when nothing is close enough"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_distance = None, self.max_distance + 1
+            for key, entry in self._entries.items():
+                if entry.params != params or entry.phash is None or not _same_size(entry.size, size):
+                    continue
+                distance = (entry.phash ^ phash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is not None:
+                entry = self._live(best_key, now)
+                if entry is not None:
+                    self.perceptual_hits += 1
+                    return entry.result
+            self.misses += 1
+        return None
+
+    def put(
+        self,
+        digest: str,
+        params: Hashable,
+        result: Dict[str, Any],
+        size: Optional[Tuple[int, int]] = None,
+        phash: Optional[int] = None
+    ) -> None:
+        if not self.enabled:
+            return
+        key = (digest, params)
+        with self._lock:
+            self._entries[key] = _Entry(params, size, phash, result, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.perceptual_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "perceptual_hits": self.perceptual_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
+
+ocr_cache = OCRResultCache()
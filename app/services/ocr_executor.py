@@ -0,0 +1,125 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+from app.core.config import (
+    OCR_EXECUTOR,
+    OCR_POOL_WORKERS,
+    OCR_MAX_CONCURRENT_REQUESTS,
+    OCR_MEMORY_SAMPLE_INTERVAL,
+    OCR_MEMORY_TRACKING,
+    OCR_WARM_LANGUAGES
+)
+from app.services.ocr_memory import Size, current_record, measured_call, request_memory
+from app.services.ocr_pipeline import init_ocr_worker
+from app.services.ocr_timing import current_timer, stage, timed_call
+
+logger = logging.getLogger(__name__)
+
+class OCRExecutor:
+    """Runs CPU-bound OCR stages off the event loop.
+
+    Work is submitted to a process pool (or a thread pool when
+    OCR_EXECUTOR=thread) sized from this worker's share of the cores, and
+    `limit()` caps how many OCR requests run at once, and how much memory
+    they are projected to need, so a burst of uploads queues instead of
+    oversubscribing the pool or getting its workers OOM-killed.
+    """
+
+    def __init__(
+        self,
+        kind: str = OCR_EXECUTOR,
+        max_workers: int = OCR_POOL_WORKERS,
+        max_concurrent_requests: int = OCR_MAX_CONCURRENT_REQUESTS
+    ):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_concurrent_requests = max_concurrent_requests
+        self._pool: Optional[Executor] = None
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    def _create_pool(self) -> Executor:
+        # Every worker loads its Tesseract engines up front
+        initializer, initargs = init_ocr_worker, (OCR_WARM_LANGUAGES,)
+        if self.kind == "thread":
+            return ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="ocr",
+                initializer=initializer,
+                initargs=initargs
+            )
+        # Spawn rather than fork: the API process runs threads, which fork
+        # does not copy safely.
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+            initargs=initargs
+        )
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            self._pool = self._create_pool()
+            logger.info(f"Started OCR {self.kind} pool with {self.max_workers} workers")
+        return self._pool
+
+    def start(self) -> None:
+        """Start every worker, and so warm its engines, before the first request"""
+        for _ in range(self.max_workers):
+            self.pool.submit(os.getpid)
+
+    @asynccontextmanager
+    async def limit(self, sizes: Iterable[Size] = ()) -> AsyncIterator[None]:
+        """Async context manager bounding concurrent OCR requests for images of `sizes`.
+
+        Raises OCRBusyError if the memory budget doesn't free up in time.
+        """
+        async with AsyncExitStack() as stack:
+            # Time spent waiting here is reported as the request's "queue" stage
+            with stage("queue"):
+                await stack.enter_async_context(request_memory(list(sizes)))
+                await self._semaphore.acquire()
+            stack.callback(self._semaphore.release)
+            yield
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn(*args)` in the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        timer = current_timer()
+        record = current_record() if OCR_MEMORY_TRACKING != "off" else None
+        call = functools.partial(fn, *args)
+        # Stages timed and memory measured inside the worker come back with
+        # the result
+        if timer is not None:
+            call = functools.partial(timed_call, fn, *args)
+        if record is not None:
+            call = functools.partial(measured_call, OCR_MEMORY_TRACKING, OCR_MEMORY_SAMPLE_INTERVAL, call)
+        try:
+            result = await loop.run_in_executor(self.pool, call)
+            if record is not None:
+                result, call_peak = result
+                record.observe(call_peak)
+            if timer is not None:
+                result, stages = result
+                timer.extend(stages)
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool so later
+            # requests aren't all failed by the broken one.
+            logger.error("OCR worker pool broke, restarting it")
+            self.shutdown(wait=False)
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+ocr_executor = OCRExecutor()
@@ -0,0 +1,524 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from app.core.config import (
+    OCR_JOB_BACKEND,
+    OCR_JOB_DB_PATH,
+    OCR_JOB_MAX_DEPTH,
+    OCR_JOB_MAX_ATTEMPTS,
+    OCR_JOB_LEASE_SECONDS,
+    OCR_JOB_RESULT_TTL_SECONDS,
+    OCR_JOB_DEFER_SECONDS,
+    OCR_JOB_EXTERNAL_WORKERS,
+    OCR_JOB_INPROCESS_WORKERS
+)
+from app.services.ocr_service import InvalidImageError, OCRBusyError, extract_text
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class QueueFullError(Exception):
+    """The job queue is at its maximum depth"""
+
+class OCRJob(NamedTuple):
+    id: str
+    status: str
+    params: Dict[str, Any]
+    attempts: int
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+class ClaimedJob(NamedTuple):
+    job: OCRJob
+    contents: bytes
+
+class JobQueue(ABC):
+    """Interface for OCR job queue backends.
+
+    Jobs are claimed with a lease; a job whose worker dies is handed out
+    again once the lease runs out, until it has used up `max_attempts`.
+    A deferred job is held back for `defer_seconds` without using one up.
+    Finished jobs are kept for `result_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        max_depth: int = OCR_JOB_MAX_DEPTH,
+        max_attempts: int = OCR_JOB_MAX_ATTEMPTS,
+        lease_seconds: float = OCR_JOB_LEASE_SECONDS,
+        result_ttl: float = OCR_JOB_RESULT_TTL_SECONDS,
+        defer_seconds: float = OCR_JOB_DEFER_SECONDS
+    ):
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.result_ttl = result_ttl
+        self.defer_seconds = defer_seconds
+
+    @abstractmethod
+    def submit(self, contents: bytes, params: Dict[str, Any]) -> OCRJob:
+        """Queue a job, raising QueueFullError when at max depth"""
+
+    @abstractmethod
+    def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        """Lease the oldest runnable job, or None if there is none"""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Record a job's result; False if `worker_id` no longer holds its lease"""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt, requeueing the job if it has attempts left.
+
+        Like `complete`, ignored (returning False) unless `worker_id` still
+        holds the job, so a worker whose lease ran out can't overwrite the
+        outcome of the worker that took the job over.
+        """
+
+    @abstractmethod
+    def defer(self, job_id: str, worker_id: str) -> bool:
+        """Requeue a job that couldn't run yet, without counting the attempt,
+        to be claimed again after `defer_seconds`; False if `worker_id` no
+        longer holds it"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[OCRJob]:
+        """The job, or None if it is unknown or past its TTL"""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Number of queued and running jobs"""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Delete finished jobs past their TTL, returning how many"""
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in a local SQLite file, shareable between processes"""
+
+    def __init__(self, path: str = OCR_JOB_DB_PATH, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    contents BLOB,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    run_after REAL,
+                    expires_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_jobs_status ON ocr_jobs (status, created_at)")
+            # Queue files from before jobs could be deferred
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(ocr_jobs)")}
+            if "run_after" not in columns:
+                conn.execute("ALTER TABLE ocr_jobs ADD COLUMN run_after REAL")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection per operation keeps this safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> OCRJob:
+        return OCRJob(
+            id=row["id"],
+            status=row["status"],
+            params=json.loads(row["params"]),
+            attempts=row["attempts"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"]
+        )
+
+    def submit(self, contents: bytes, params: Dict[str, Any]) -> OCRJob:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            depth = conn.execute(
+                "SELECT COUNT(*) FROM ocr_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if depth >= self.max_depth:
+                conn.execute("ROLLBACK")
+                raise QueueFullError(f"OCR job queue is full ({depth} jobs)")
+            conn.execute(
+                "INSERT INTO ocr_jobs (id, status, params, contents, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(params), contents, now, now)
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return OCRJob(job_id, QUEUED, params, 0, None, None, now, now)
+
+    def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs whose worker died mid-run have used their last attempt
+            conn.execute(
+                "UPDATE ocr_jobs SET status = ?, error = ?, contents = NULL, expires_at = ?, updated_at = ? "
+                "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                (FAILED, "Worker lease expired", now + self.result_ttl, now, RUNNING, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT * FROM ocr_jobs WHERE (status = ? AND (run_after IS NULL OR run_after <= ?)) "
+                "OR (status = ? AND lease_expires_at < ?) ORDER BY created_at LIMIT 1",
+                (QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE ocr_jobs SET status = ?, attempts = attempts + 1, worker_id = ?, "
+                "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, worker_id, now + self.lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        job = self._to_job(row)._replace(status=RUNNING, attempts=row["attempts"] + 1, updated_at=now)
+        return ClaimedJob(job, row["contents"])
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        now = time.time()
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "UPDATE ocr_jobs SET status = ?, result = ?, error = NULL, contents = NULL, "
+                "expires_at = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (SUCCEEDED, json.dumps(result), now + self.result_ttl, now, job_id, worker_id, RUNNING)
+            ).rowcount > 0
+        finally:
+            conn.close()
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT attempts FROM ocr_jobs WHERE id = ? AND worker_id = ? AND status = ?",
+                (job_id, worker_id, RUNNING)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+            if retry and row["attempts"] < self.max_attempts:
+                conn.execute(
+                    "UPDATE ocr_jobs SET status = ?, error = ?, worker_id = NULL, lease_expires_at = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    (QUEUED, error, now, job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE ocr_jobs SET status = ?, error = ?, contents = NULL, expires_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (FAILED, error, now + self.result_ttl, now, job_id)
+                )
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+    def defer(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "UPDATE ocr_jobs SET status = ?, attempts = attempts - 1, worker_id = NULL, "
+                "lease_expires_at = NULL, run_after = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (QUEUED, now + self.defer_seconds, now, job_id, worker_id, RUNNING)
+            ).rowcount > 0
+        finally:
+            conn.close()
+
+    def get(self, job_id: str) -> Optional[OCRJob]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM ocr_jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        return self._to_job(row) if row else None
+
+    def depth(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM ocr_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def purge_expired(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM ocr_jobs WHERE expires_at < ?", (time.time(),)).rowcount
+        finally:
+            conn.close()
+
+class InMemoryJobQueue(JobQueue):
+    """Job queue held in this process; its workers must run here too"""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_job(record: dict) -> OCRJob:
+        return OCRJob(**{field: record[field] for field in OCRJob._fields})
+
+    def _runnable(self, record: dict, now: float) -> bool:
+        if record["status"] == QUEUED:
+            return record["run_after"] is None or record["run_after"] <= now
+        return record["status"] == RUNNING and record["lease_expires_at"] < now
+
+    def _finish(self, record: dict, status: str, now: float) -> None:
+        record.update(status=status, contents=None, expires_at=now + self.result_ttl, updated_at=now)
+
+    def submit(self, contents: bytes, params: Dict[str, Any]) -> OCRJob:
+        now = time.time()
+        with self._lock:
+            depth = sum(1 for r in self._jobs.values() if r["status"] in (QUEUED, RUNNING))
+            if depth >= self.max_depth:
+                raise QueueFullError(f"OCR job queue is full ({depth} jobs)")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id, "status": QUEUED, "params": params, "contents": contents,
+                "attempts": 0, "result": None, "error": None, "worker_id": None, "lease_expires_at": None,
+                "run_after": None, "expires_at": None, "created_at": now, "updated_at": now
+            }
+            return self._to_job(self._jobs[job_id])
+
+    def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        now = time.time()
+        with self._lock:
+            for record in sorted(self._jobs.values(), key=lambda r: r["created_at"]):
+                if not self._runnable(record, now):
+                    continue
+                if record["attempts"] >= self.max_attempts:
+                    # Its worker died mid-run on the last attempt
+                    record["error"] = "Worker lease expired"
+                    self._finish(record, FAILED, now)
+                    continue
+                record.update(
+                    status=RUNNING, attempts=record["attempts"] + 1, worker_id=worker_id,
+                    lease_expires_at=now + self.lease_seconds, updated_at=now
+                )
+                return ClaimedJob(self._to_job(record), record["contents"])
+        return None
+
+    def _held(self, job_id: str, worker_id: str) -> Optional[dict]:
+        record = self._jobs.get(job_id)
+        if record is None or record["status"] != RUNNING or record["worker_id"] != worker_id:
+            return None
+        return record
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        with self._lock:
+            record = self._held(job_id, worker_id)
+            if record is None:
+                return False
+            record.update(result=result, error=None)
+            self._finish(record, SUCCEEDED, time.time())
+            return True
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        now = time.time()
+        with self._lock:
+            record = self._held(job_id, worker_id)
+            if record is None:
+                return False
+            record["error"] = error
+            if retry and record["attempts"] < self.max_attempts:
+                record.update(status=QUEUED, worker_id=None, lease_expires_at=None, updated_at=now)
+            else:
+                self._finish(record, FAILED, now)
+            return True
+
+    def defer(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            record = self._held(job_id, worker_id)
+            if record is None:
+                return False
+            record.update(
+                status=QUEUED, attempts=record["attempts"] - 1, worker_id=None,
+                lease_expires_at=None, run_after=now + self.defer_seconds, updated_at=now
+            )
+            return True
+
+    def get(self, job_id: str) -> Optional[OCRJob]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None or (record["expires_at"] is not None and record["expires_at"] <= time.time()):
+                return None
+            return self._to_job(record)
+
+    def depth(self) -> int:
+        with self._lock:
+            return sum(1 for r in self._jobs.values() if r["status"] in (QUEUED, RUNNING))
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, r in self._jobs.items() if r["expires_at"] is not None and r["expires_at"] < now]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+_job_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    """The configured job queue backend (one per process)"""
+    global _job_queue
+    if _job_queue is None:
+        if OCR_JOB_BACKEND == "memory":
+            _job_queue = InMemoryJobQueue()
+        elif OCR_JOB_BACKEND == "sqlite":
+            _job_queue = SQLiteJobQueue()
+        else:
+            raise ValueError(f"Unknown OCR_JOB_BACKEND '{OCR_JOB_BACKEND}'")
+    return _job_queue
+
+async def run_worker(
+    queue: JobQueue,
+    worker_id: str,
+    stop: asyncio.Event,
+    poll_interval: float = 0.5,
+    purge_interval: float = 60.0
+) -> None:
+    """Claim and run OCR jobs until `stop` is set"""
+    last_purge = 0.0
+    while not stop.is_set():
+        # Queue errors (e.g. SQLite "database is locked") are logged and
+        # retried after a poll interval rather than ending the worker
+        if time.monotonic() - last_purge > purge_interval:
+            last_purge = time.monotonic()
+            try:
+                purged = await asyncio.to_thread(queue.purge_expired)
+            except Exception as e:
+                logger.error(f"OCR job worker {worker_id} could not purge expired jobs: {str(e)}", exc_info=True)
+            else:
+                if purged:
+                    logger.info(f"Purged {purged} expired OCR jobs")
+
+        try:
+            claimed = await asyncio.to_thread(queue.claim, worker_id)
+        except Exception as e:
+            logger.error(f"OCR job worker {worker_id} could not claim a job: {str(e)}", exc_info=True)
+            claimed = None
+        if claimed is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        job = claimed.job
+        try:
+            result = await extract_text(claimed.contents, **job.params)
+        except InvalidImageError as e:
+            # Retrying won't make the upload decodable
+            outcome = (queue.fail, job.id, worker_id, str(e), False)
+        except OCRBusyError as e:
+            # Not the job's fault; try again once the memory budget has had time to free up
+            logger.warning(f"OCR job {job.id} deferred for {queue.defer_seconds:.0f}s: {str(e)}")
+            outcome = (queue.defer, job.id, worker_id)
+        except Exception as e:
+            logger.error(f"OCR job {job.id} attempt {job.attempts} failed: {str(e)}", exc_info=True)
+            outcome = (queue.fail, job.id, worker_id, f"Processing error: {str(e)}")
+        else:
+            outcome = (queue.complete, job.id, worker_id, result)
+        try:
+            recorded = await asyncio.to_thread(*outcome)
+        except Exception as e:
+            # The lease runs out and the job is claimed again
+            logger.error(f"OCR job {job.id} attempt {job.attempts} could not be recorded: {str(e)}", exc_info=True)
+            continue
+        if not recorded:
+            logger.warning(f"OCR job {job.id} attempt {job.attempts} outlived its lease, outcome discarded")
+
+_stop_workers: Optional[asyncio.Event] = None
+_worker_tasks: List[asyncio.Task] = []
+
+def start_inprocess_workers(count: int = OCR_JOB_INPROCESS_WORKERS) -> None:
+    """Run job workers as tasks on the current event loop.
+
+    The memory backend can only be served from inside the API process, and
+    without external workers (OCR_JOB_EXTERNAL_WORKERS) nothing else would
+    claim jobs, so either way there is always at least one.
+    """
+    global _stop_workers
+    queue = get_job_queue()
+    if isinstance(queue, InMemoryJobQueue) or not OCR_JOB_EXTERNAL_WORKERS:
+        count = max(count, 1)
+    if count <= 0:
+        return
+    _stop_workers = asyncio.Event()
+    # Worker ids must be unique across every process sharing the queue, or
+    # one process's worker could report on another's lease
+    for i in range(count):
+        worker_id = f"{os.uname().nodename}-{os.getpid()}-api-{i}"
+        _worker_tasks.append(asyncio.create_task(run_worker(queue, worker_id, _stop_workers)))
+    logger.info(f"Started {count} in-process OCR job workers")
+
+async def stop_inprocess_workers() -> None:
+    if _stop_workers is None:
+        return
+    _stop_workers.set()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
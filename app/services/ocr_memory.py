@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import (
+    OCR_MAX_DECODE_PIXELS,
+    OCR_MEMORY_BUDGET_MB,
+    OCR_MEMORY_BYTES_PER_PIXEL,
+    OCR_MEMORY_TRACKING,
+    OCR_MEMORY_WAIT_SECONDS
+)
+
+# Memory accounting for OCR requests. Each request holds a `MemoryRecord`
+# (with its image sizes) for as long as it holds `ocr_executor.limit()`;
+# with tracking on, every pool call made for it is measured in the worker
+# (see `measured_call`), and the request's peak is the most its calls
+# running at the same time added together. Finished records feed
+# `memory_stats` and the projections `memory_budget` admits requests by.
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+Size = Tuple[int, int]  # width, height
+CallPeak = Tuple[float, float, int]  # started, finished (time.monotonic), bytes added at peak
+
+_current_record: ContextVar[Optional["MemoryRecord"]] = ContextVar("ocr_memory_record", default=None)
+
+class OCRBusyError(Exception):
+    """Not enough of the OCR memory budget came free in time"""
+
+class MemoryRecord:
+    """Image sizes and measured peak memory of one OCR request"""
+
+    def __init__(self, sizes: List[Size]):
+        self.sizes = sizes
+        self.calls: List[CallPeak] = []
+
+    @property
+    def pixels(self) -> int:
+        """Pixels decoded for the request's images, which larger photos are shrunk to"""
+        return sum(min(w * h, OCR_MAX_DECODE_PIXELS) for w, h in self.sizes)
+
+    def observe(self, call: CallPeak) -> None:
+        self.calls.append(call)
+
+    @property
+    def peak(self) -> int:
+        """Bytes at the request's peak. Variant and tile calls run in parallel
+        workers, so the peaks of calls that overlap are added up."""
+        # The overlap is largest at the moment some call starts
+        return max(
+            (sum(peak for start, end, peak in self.calls if start <= at <= end) for at, _, _ in self.calls),
+            default=0
+        )
+
+def current_record() -> Optional[MemoryRecord]:
+    return _current_record.get()
+
+def _rss() -> int:
+    """Resident set size of this process in bytes (0 where /proc isn't available)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+class _RSSSampler:
+    """Polls the process RSS on a background thread, keeping the highest value seen"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.peak = _rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, name="ocr-rss", daemon=True)
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss())
+
+    def __enter__(self) -> "_RSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss())
+
+def measured_call(
+    mode: str,
+    interval: float,
+    fn: Callable[..., Any],
+    *args: Any
+) -> Tuple[Any, CallPeak]:
+    """Run `fn(*args)` in an OCR worker, returning its result and the bytes it added at peak.
+
+    "tracemalloc" counts Python and NumPy (so OpenCV) allocations exactly
+    but not Tesseract's own; "rss" samples the whole process every
+    `interval` seconds. Both see the whole process, so with
+    OCR_EXECUTOR=thread concurrent calls inflate each other's figures.
+    The peak comes back with when the call ran, for `MemoryRecord`.
+    """
+    start = time.monotonic()
+    if mode == "tracemalloc":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = fn(*args)
+        return result, (start, time.monotonic(), max(0, tracemalloc.get_traced_memory()[1] - baseline))
+
+    baseline = _rss()
+    with _RSSSampler(interval) as sampler:
+        result = fn(*args)
+    return result, (start, time.monotonic(), max(0, sampler.peak - baseline))
+
+class MemoryStats:
+    """Aggregated per-request peaks, keeping the largest requests seen"""
+
+    KEEP_LARGEST = 10
+
+    def __init__(self):
+        self.requests = 0
+        self.max_peak = 0
+        self._largest: List[Tuple[int, float, List[Size]]] = []  # min-heap of (peak, time, sizes)
+
+    def observe(self, record: MemoryRecord) -> None:
+        peak = record.peak
+        self.requests += 1
+        self.max_peak = max(self.max_peak, peak)
+        entry = (peak, time.time(), record.sizes)
+        if len(self._largest) < self.KEEP_LARGEST:
+            heapq.heappush(self._largest, entry)
+        elif entry > self._largest[0]:
+            heapq.heapreplace(self._largest, entry)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "max_peak_mb": round(self.max_peak / MB, 1),
+            "largest": [
+                {
+                    "peak_mb": round(peak / MB, 1),
+                    "images": [{"width": w, "height": h} for w, h in sizes],
+                    "at": at
+                }
+                for peak, at, sizes in sorted(self._largest, reverse=True)
+            ]
+        }
+
+    def clear(self) -> None:
+        self.requests = 0
+        self.max_peak = 0
+        self._largest.clear()
+
+memory_stats = MemoryStats()
+
+class MemoryBudget:
+    """Admits OCR requests while their projected peaks fit in a memory limit.
+
+    A request's projection is `bytes_per_pixel` times its decoded pixel
+    count. Measured peaks raise `bytes_per_pixel` straight away and lower
+    it only gradually, so the projection errs on the high side. Requests
+    that don't fit wait for others to finish, and after `wait_seconds`
+    are refused with OCRBusyError. One projected above the whole limit
+    runs once nothing else is in flight. A limit of 0 admits everything.
+    """
+
+    def __init__(
+        self,
+        limit_bytes: int = OCR_MEMORY_BUDGET_MB * MB,
+        wait_seconds: float = OCR_MEMORY_WAIT_SECONDS,
+        bytes_per_pixel: float = OCR_MEMORY_BYTES_PER_PIXEL
+    ):
+        self.limit_bytes = limit_bytes
+        self.wait_seconds = wait_seconds
+        self.bytes_per_pixel = bytes_per_pixel
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._changed = asyncio.Condition()
+
+    def projected(self, pixels: int) -> int:
+        return int(self.bytes_per_pixel * pixels)
+
+    def learn(self, record: MemoryRecord) -> None:
+        peak = record.peak
+        if peak and record.pixels:
+            ratio = peak / record.pixels
+            self.bytes_per_pixel = max(ratio, 0.9 * self.bytes_per_pixel + 0.1 * ratio)
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.in_flight + nbytes <= self.limit_bytes
+
+    @asynccontextmanager
+    async def reserve(self, pixels: int) -> AsyncIterator[None]:
+        """Hold the projected memory for `pixels` decoded pixels for the block"""
+        if self.limit_bytes <= 0:
+            yield
+            return
+        nbytes = min(self.projected(pixels), self.limit_bytes)
+        async with self._changed:
+            if not self._fits(nbytes):
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self._changed.wait_for(lambda: self._fits(nbytes)), self.wait_seconds)
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    raise OCRBusyError("OCR service is at its memory limit, try again shortly") from None
+                finally:
+                    self.waiting -= 1
+            self.in_flight += nbytes
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.in_flight -= nbytes
+                self._changed.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit_mb": round(self.limit_bytes / MB, 1),
+            "in_flight_mb": round(self.in_flight / MB, 1),
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "bytes_per_pixel": round(self.bytes_per_pixel, 2)
+        }
+
+memory_budget = MemoryBudget()
+
+@asynccontextmanager
+async def request_memory(sizes: List[Size]) -> AsyncIterator[MemoryRecord]:
+    """Admit an OCR request for images of `sizes` against the budget and record its peak memory"""
+    record = MemoryRecord(sizes)
+    async with memory_budget.reserve(record.pixels):
+        token = _current_record.set(record)
+        try:
+            yield record
+        finally:
+            _current_record.reset(token)
+    peak = record.peak
+    if OCR_MEMORY_TRACKING != "off" and peak:
+        memory_stats.observe(record)
+        memory_budget.learn(record)
+        logger.debug(f"OCR request for {record.sizes} peaked at {peak / MB:.1f} MB")
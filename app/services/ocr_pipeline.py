@@ -0,0 +1,802 @@
+import difflib
+import io
+import logging
+import math
+import re
+import threading
+import warnings
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.core.config import (
+    OCR_MAX_DECODE_PIXELS,
+    OCR_MAX_IMAGE_PIXELS,
+    OCR_ORIENTATION_CHECK_SIDE,
+    OCR_OSD_MAX_SIDE,
+    OCR_OSD_MIN_CONFIDENCE,
+    OCR_REGION_CROP,
+    OCR_REGION_DETECT_SIDE,
+    OCR_REGION_MAX_BLOCKS,
+    OCR_REGION_MAX_COVERAGE,
+    OCR_TILE_MIN_PIXELS,
+    OCR_TILE_MIN_SIDE,
+    OCR_TILE_OVERLAP
+)
+from app.services.ocr_timing import stage
+from app.services.tesseract_engine import OEM_TESSERACT_ONLY, get_engine_pool
+
+logger = logging.getLogger(__name__)
+
+# The stages in this module are plain functions on NumPy arrays with no
+# FastAPI imports, so they can be pickled and run in OCR worker processes.
+
+TESSERACT_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-.,;:/%'\"!?()[]{}@#$^&*_+=<>|° "
+
+class InvalidImageError(ValueError):
+    """The upload could not be decoded as an image"""
+
+class ImageTooLargeError(InvalidImageError):
+    """The upload has more pixels than the service accepts"""
+
+def image_size(contents: bytes, max_pixels: int = OCR_MAX_IMAGE_PIXELS) -> Optional[Tuple[int, int]]:
+    """Width and height from the image header, or None if Pillow can't read it.
+
+    Only the header is parsed, so oversized uploads are refused with
+    ImageTooLargeError before any pixels are decoded.
+    """
+    too_large = ImageTooLargeError(f"Image is too large (the limit is {max_pixels / 1e6:.0f} megapixels)")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            with Image.open(io.BytesIO(contents)) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            raise too_large from None  # past even Pillow's own limit
+        except Exception:
+            return None
+    if width * height > max_pixels:
+        raise too_large
+    return width, height
+
+# imdecode flags (colour, grayscale) that decode at 1/1, 1/2, 1/4 or 1/8 scale
+DECODE_FLAGS = {
+    1: (cv2.IMREAD_COLOR, cv2.IMREAD_GRAYSCALE),
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+}
+
+def decode_image(
+    contents: bytes,
+    grayscale: bool = False,
+    max_pixels: int = OCR_MAX_DECODE_PIXELS
+) -> Optional[np.ndarray]:
+    """Decode uploaded bytes into a BGR (or grayscale) image, or None if undecodable.
+
+    Photos over max_pixels are decoded at the largest 1/2, 1/4 or 1/8
+    reduction that still leaves max_pixels (JPEGs decode straight to that
+    size, never holding the full image), then shrunk the rest of the way.
+    """
+    # imdecode applies the EXIF orientation tag, so phone photos come out the
+    # way the camera was held and usually need no further rotation
+    with stage("decode"):
+        size = image_size(contents)
+        reduction = 1
+        if size is not None:
+            pixels = size[0] * size[1]
+            while reduction < 8 and pixels / (2 * reduction) ** 2 >= max_pixels:
+                reduction *= 2
+        np_array = np.frombuffer(contents, np.uint8)
+        image = cv2.imdecode(np_array, DECODE_FLAGS[reduction][grayscale])
+        if image is None:
+            return None
+
+        h, w = image.shape[:2]
+        if h * w > max_pixels:
+            scale = math.sqrt(max_pixels / (h * w))
+            image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        return image
+
+def count_pages(contents: bytes) -> int:
+    """Number of pages (TIFF) or frames (GIF, WebP, ...) in an upload.
+
+    Only headers are read. Formats Pillow can't open count as one page,
+    left to imdecode.
+    """
+    with stage("count_pages"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            image = Image.open(io.BytesIO(contents))
+        except Image.DecompressionBombError:
+            raise ImageTooLargeError("Image is too large")
+        except Exception:
+            return 1
+        with image:
+            return getattr(image, "n_frames", 1)
+
+def read_page(contents: bytes, index: int, max_pixels: int = OCR_MAX_DECODE_PIXELS) -> Optional[bytes]:
+    """Page `index` of a multi-page upload, on its own, for the single-image pipeline.
+
+    The page is re-encoded as a grayscale PNG, upright (imdecode won't see
+    its EXIF tags) and within the decode budget. Pages are read one at a
+    time so a long document is never held decoded all at once. None if
+    the page can't be read.
+    """
+    with stage("read_page"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            image = Image.open(io.BytesIO(contents))
+        except Image.DecompressionBombError:
+            raise ImageTooLargeError("Image is too large")
+        except Exception:
+            return None
+
+        with image:
+            try:
+                image.seek(index)
+            except EOFError:
+                return None
+            width, height = image.size
+            if width * height > OCR_MAX_IMAGE_PIXELS:
+                raise ImageTooLargeError(f"Page {index + 1} is too large")
+            try:
+                page = ImageOps.exif_transpose(image).convert("L")
+            except Exception:
+                return None
+            if width * height > max_pixels:
+                scale = math.sqrt(max_pixels / (width * height))
+                page = page.resize((int(page.width * scale), int(page.height * scale)), Image.Resampling.BOX)
+            buffer = io.BytesIO()
+            page.save(buffer, "PNG", compress_level=1)
+            return buffer.getvalue()
+
+def perceptual_hash(contents: bytes, hash_size: int = 16) -> Optional[Tuple[Tuple[int, int], int]]:
+    """Difference hash (dHash) of an upload, with the size it was hashed at.
+
+    Decodes at 1/8 scale in grayscale, which is much cheaper than a full
+    decode and plenty for a hash_size x hash_size gradient grid.
+    """
+    np_array = np.frombuffer(contents, np.uint8)
+    try:
+        small = cv2.imdecode(np_array, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    except cv2.error:
+        # Images under 8px a side can't be reduced; they are tiny anyway
+        small = cv2.imdecode(np_array, cv2.IMREAD_GRAYSCALE)
+    if small is None:
+        return None
+    resized = cv2.resize(small, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (resized[:, 1:] > resized[:, :-1]).flatten()
+    return small.shape[:2], int("".join("1" if bit else "0" for bit in bits), 2)
+
+def downscale(image: np.ndarray, max_side: int) -> np.ndarray:
+    """Copy of `image` shrunk to fit within max_side, or `image` if already smaller"""
+    scale = max_side / max(image.shape[:2])
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Otsu mask that is non-zero on text, whichever way round the text's contrast is"""
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    if cv2.countNonZero(mask) > mask.size // 2:
+        mask = cv2.bitwise_not(mask)  # light text on a dark background
+    return mask
+
+def ascender_counts(gray: np.ndarray, max_glyphs: int = 1500) -> Tuple[int, int]:
+    """Count glyphs rising above / dropping below the x-height band of their line.
+
+    Latin lowercase text has several times more ascenders (b, d, f, h, k,
+    l, t, capitals) than descenders (g, j, p, q, y), so upright text gives
+    many more of the former, and upside-down text the reverse. Each glyph
+    is compared to the median band of its horizontal neighbours, which
+    tolerates skewed lines. Text not running horizontally has few
+    neighbours to compare against and counts as neither.
+    """
+    mask = ink_mask(gray)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    x, y, w, h = (stats[1:, i].astype(float) for i in range(4))
+    glyph = (h >= 5) & (h <= mask.shape[0] / 10) & (w >= 2) & (w <= 2 * h)
+    x, y, w, h = (values[glyph][:max_glyphs] for values in (x, y, w, h))
+    if len(h) < 20:
+        return 0, 0
+
+    x_height = np.median(h)
+    cx, cy, top, bottom = x + w / 2, y + h / 2, y, y + h
+    neighbours = (np.abs(cx[:, None] - cx) < 5 * x_height) & (np.abs(cy[:, None] - cy) < 0.6 * x_height)
+    ascenders = descenders = 0
+    for i, row in enumerate(neighbours):
+        line = np.flatnonzero(row)
+        if len(line) < 4:
+            continue
+        band_top, band_bottom = np.median(top[line]), np.median(bottom[line])
+        band = band_bottom - band_top
+        if band < 4:
+            continue
+        ascenders += top[i] < band_top - 0.3 * band
+        descenders += bottom[i] > band_bottom + 0.3 * band
+    return int(ascenders), int(descenders)
+
+def looks_upright(gray: np.ndarray, min_ascenders: int = 5) -> bool:
+    """Cheap check that text already reads upright, so OSD can be skipped.
+
+    Only answers yes on clear evidence; all-caps, sparse or rotated text
+    falls through to OSD.
+    """
+    ascenders, descenders = ascender_counts(gray)
+    return ascenders >= min_ascenders and ascenders >= 2 * descenders
+
+def detect_rotation(image: np.ndarray) -> Tuple[int, float]:
+    """Degrees to rotate the image by clockwise to make its text upright, and OSD's confidence"""
+    pool = get_engine_pool()
+    if pool is None:
+        osd = pytesseract.image_to_osd(image)
+        angle = int(re.search(r'Rotate: (\d+)', osd).group(1))
+        return angle, float(re.search(r'Orientation confidence: ([\d.]+)', osd).group(1))
+    with pool.engine("osd", OEM_TESSERACT_ONLY) as engine:
+        orientation, confidence = engine.detect_orientation(image)
+    # Same relation as tesseract's own OSD output ("Rotate: ...")
+    return (360 - orientation) % 360, confidence
+
+ROTATIONS = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+def orient_image(image: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Detect and correct text orientation, returning the rotation applied.
+
+    Skips OSD when the text already looks upright, and otherwise runs it on
+    a downscaled copy rather than the full-resolution upload.
+    """
+    with stage("orientation"):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = downscale(gray, OCR_OSD_MAX_SIDE)
+        if looks_upright(downscale(gray, OCR_ORIENTATION_CHECK_SIDE)):
+            return image, 0
+        try:
+            angle, confidence = detect_rotation(gray)
+            if angle in ROTATIONS and confidence >= OCR_OSD_MIN_CONFIDENCE:
+                return cv2.rotate(image, ROTATIONS[angle]), angle
+        except Exception as e:
+            logger.warning(f"Orientation detection failed: {str(e)}")
+        return image, 0
+
+def correct_orientation(image: np.ndarray) -> np.ndarray:
+    """Detect and correct text orientation"""
+    return orient_image(image)[0]
+
+Box = Tuple[int, int, int, int]  # x, y, w, h
+
+class Tile(NamedTuple):
+    """Part of an enhanced text block, and where it sits in that block"""
+    image: np.ndarray
+    box: Box
+    # Where the block itself sits in the upright image
+    region: Optional[Box] = None
+
+def _merge_boxes(boxes: List[Box]) -> List[Box]:
+    """Union boxes that overlap or touch until none do"""
+    merged = list(boxes)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] <= b[0] + b[2] and b[0] <= a[0] + a[2] and a[1] <= b[1] + b[3] and b[1] <= a[1] + a[3]:
+                    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+                    x1, y1 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+                    merged[i] = (x0, y0, x1 - x0, y1 - y0)
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+def detect_text_regions(
+    image: np.ndarray,
+    detect_side: int = OCR_REGION_DETECT_SIDE,
+    max_blocks: int = OCR_REGION_MAX_BLOCKS,
+    max_coverage: float = OCR_REGION_MAX_COVERAGE
+) -> List[Box]:
+    """Locate the text block(s) on a downscaled copy of the image.
+
+    Every block of small print is kept; only logo-sized lettering and
+    photos are dropped. Blocks are padded by a text line and merged where
+    they overlap or touch, so no line is cut off or read twice. Returns
+    non-overlapping boxes in full-resolution coordinates in reading order,
+    or an empty list when no crop is worthwhile (no text found, more than
+    `max_blocks` blocks, or the blocks already cover most of the frame).
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, detect_side / max(h, w))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    small = to_grayscale(small) if len(small.shape) > 2 else small
+
+    # Characters show up as dense, strong local gradients
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    # Join characters into lines, then lines into paragraph blocks
+    sh, sw = small.shape[:2]
+    lines = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, sw // 60), 1)))
+    blocks = cv2.dilate(lines, cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, sw // 80), max(3, sh // 60))))
+
+    contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    candidates = []
+    for contour in contours:
+        x, y, bw, bh = cv2.boundingRect(contour)
+        if bw < sw * 0.05 or bh < 8:
+            continue
+        # Text blocks are busy but not solid; skip flat areas and photos
+        density = cv2.countNonZero(mask[y:y + bh, x:x + bw]) / float(bw * bh)
+        if not 0.05 <= density <= 0.6:
+            continue
+        text_rows = (lines[y:y + bh, x:x + bw] > 0).mean(axis=1) > 0.1
+        line_count = max(1, int(np.count_nonzero(text_rows[1:] & ~text_rows[:-1])) + int(text_rows[0]))
+        candidates.append((line_count, bw * bh, bh / line_count, (x, y, bw, bh)))
+
+    if not candidates:
+        return []
+
+    # Ingredient lists are many lines of small print, so the block with the
+    # most lines sets the print size; lettering three times that size is a
+    # logo or product name
+    print_height = max(candidates)[2]
+    selected = [
+        (line_height, box) for _, _, line_height, box in candidates
+        if line_height <= 3 * print_height
+    ]
+
+    # Pad each block by a whole text line, so its first and last lines are
+    # never cut through, then merge the blocks the padding makes touch
+    pad = max(4, int(0.02 * max(sw, sh)))
+    padded = []
+    for line_height, (x, y, bw, bh) in selected:
+        pad_y = max(pad, int(line_height))
+        x0, y0 = max(0, x - pad), max(0, y - pad_y)
+        x1, y1 = min(sw, x + bw + pad), min(sh, y + bh + pad_y)
+        padded.append((x0, y0, x1 - x0, y1 - y0))
+    merged = _merge_boxes(padded)
+
+    # Crop to a few blocks at most; scattered text is OCR'd whole rather
+    # than dropped
+    if len(merged) > max_blocks or sum(bw * bh for _, _, bw, bh in merged) > max_coverage * sw * sh:
+        return []
+
+    # Map back to full resolution
+    regions = [
+        (int(x / scale), int(y / scale), int(bw / scale), int(bh / scale))
+        for x, y, bw, bh in merged
+    ]
+    return sorted(regions, key=lambda box: (box[1], box[0]))
+
+def crop_text_regions(image: np.ndarray) -> List[Tuple[np.ndarray, Box]]:
+    """Crops of the text block(s) and where they sit, or the whole image"""
+    with stage("crop"):
+        regions = detect_text_regions(image) if OCR_REGION_CROP else []
+    if not regions:
+        h, w = image.shape[:2]
+        return [(image, (0, 0, w, h))]
+    return [(image[y:y + h, x:x + w], (x, y, w, h)) for x, y, w, h in regions]
+
+def enhance_image(image: np.ndarray) -> np.ndarray:
+    """Enhance image resolution if needed"""
+    h, w = image.shape[:2]
+    min_dim = 1800  # Minimum dimension for good OCR results
+
+    if max(h, w) < min_dim:
+        scale_factor = min_dim / max(h, w)
+        return cv2.resize(image, None, fx=scale_factor, fy=scale_factor,
+                          interpolation=cv2.INTER_CUBIC)
+    return image
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """Convert to grayscale, copying images that already are"""
+    if len(image.shape) > 2:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image.copy()
+
+# Variant steps take an optional `dst` buffer of the input's shape to write
+# into instead of allocating their output
+
+def denoise(gray: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    return cv2.fastNlMeansDenoising(gray, dst, h=10, searchWindowSize=21, templateWindowSize=7)
+
+def sharpen(image: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+    return cv2.filter2D(image, -1, kernel, dst)
+
+def otsu_threshold(image: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    _, otsu = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst)
+    return otsu
+
+def adaptive_threshold(image: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    return cv2.adaptiveThreshold(
+        image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst
+    )
+
+_scratch = threading.local()
+
+def scratch_buffer(shape: Tuple[int, ...]) -> np.ndarray:
+    """A uint8 array of `shape` backed by this worker thread's reusable buffer.
+
+    The buffer grows to the largest variant the worker has built (at most
+    the decode budget) instead of a new one being allocated per variant,
+    so only hold a scratch array until the task that asked for it ends.
+    """
+    size = math.prod(shape)
+    buffer = getattr(_scratch, "buffer", None)
+    if buffer is None or buffer.size < size:
+        buffer = _scratch.buffer = np.empty(size, np.uint8)
+    return buffer[:size].reshape(shape)
+
+# Each OCR variant is derived from a parent variant by one step, with the
+# grayscale image as the root. Variants can then be built lazily, reusing
+# whichever ancestors (e.g. the expensive denoise) were already computed.
+VARIANT_ROOT = "gray"
+VARIANT_STEPS: Dict[str, Tuple[str, Callable[[np.ndarray], np.ndarray]]] = {
+    "denoised": ("gray", denoise),
+    "sharpened": ("denoised", sharpen),
+    "otsu": ("sharpened", otsu_threshold),
+    "adaptive": ("denoised", adaptive_threshold),
+    # Inverted thresholds handle white-on-black text
+    "otsu_inverted": ("otsu", cv2.bitwise_not),
+    "adaptive_inverted": ("adaptive", cv2.bitwise_not),
+}
+VARIANT_NAMES = [VARIANT_ROOT] + list(VARIANT_STEPS)
+
+def variant_parent(name: str) -> Optional[str]:
+    return VARIANT_STEPS[name][0] if name != VARIANT_ROOT else None
+
+def plan_variant_steps(names: Iterable[str], available: Iterable[str]) -> List[str]:
+    """List the variants to build, parents first, to get `names` from `available`"""
+    available = set(available) | {VARIANT_ROOT}
+    plan: List[str] = []
+
+    def visit(name: str) -> None:
+        if name in available or name in plan:
+            return
+        visit(variant_parent(name))
+        plan.append(name)
+
+    for name in names:
+        visit(name)
+    return plan
+
+def build_variants(sources: Dict[str, np.ndarray], names: List[str]) -> Dict[str, np.ndarray]:
+    """Build `names`, ordered parents first, from `sources`; returns the new variants"""
+    built = dict(sources)
+    for name in names:
+        parent, step = VARIANT_STEPS[name]
+        with stage(f"variant.{name}"):
+            built[name] = step(built[parent])
+    return {name: built[name] for name in names}
+
+def create_processed_variants(image: np.ndarray) -> List[np.ndarray]:
+    """Create multiple processed versions of the image for best OCR results"""
+    gray = to_grayscale(image)
+    built = build_variants({VARIANT_ROOT: gray}, list(VARIANT_STEPS))
+    return [gray] + [built[name] for name in VARIANT_STEPS]
+
+def prepare_image(contents: bytes, max_tiles: int = 1) -> Optional[List[List[Tile]]]:
+    """Decode, orient, crop, enhance and tile an upload into grayscale OCR base images"""
+    # Every later stage works in grayscale, so colour is never decoded
+    image = decode_image(contents, grayscale=True)
+    if image is None:
+        return None
+
+    # Step 1: Correct orientation
+    corrected = correct_orientation(image)
+
+    # Steps 2-3: crop, enhance and tile
+    return crop_and_enhance(corrected, max_tiles)
+
+def _blank_runs(ink: np.ndarray, lo: int, hi: int) -> List[Tuple[int, int]]:
+    """(start, end) runs of blank lines in a projection profile, within [lo, hi)"""
+    blank = np.flatnonzero(ink[lo:hi] == 0) + lo
+    if not len(blank):
+        return []
+    breaks = np.flatnonzero(np.diff(blank) > 1)
+    starts = np.concatenate(([blank[0]], blank[breaks + 1]))
+    ends = np.concatenate((blank[breaks], [blank[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def _trim_box(mask: np.ndarray, box: Box, pad: int = 16) -> Optional[Box]:
+    """Shrink a box to the ink inside it plus `pad`, or None if it holds none"""
+    x, y, w, h = box
+    cell = mask[y:y + h, x:x + w] > 0
+    columns = np.flatnonzero(cell.sum(axis=0) > max(1, h // 500))
+    rows = np.flatnonzero(cell.sum(axis=1) > max(1, w // 500))
+    if not len(columns) or not len(rows):
+        return None
+    x0, x1 = max(0, columns[0] - pad), min(w, columns[-1] + 1 + pad)
+    y0, y1 = max(0, rows[0] - pad), min(h, rows[-1] + 1 + pad)
+    return x + int(x0), y + int(y0), int(x1 - x0), int(y1 - y0)
+
+def _split_box(mask: np.ndarray, box: Box, min_side: int, overlap: int) -> Optional[Tuple[Box, Box]]:
+    """Cut a box in two along its widest column gutter, a blank row or the row with least ink"""
+    x, y, w, h = box
+    cell = mask[y:y + h, x:x + w] > 0
+
+    if w >= 2 * min_side:
+        # Specks of noise shouldn't hide a gutter
+        columns = cell.sum(axis=0) > max(1, h // 500)
+        gutters = [run for run in _blank_runs(columns, min_side, w - min_side) if run[1] - run[0] >= max(8, w // 100)]
+        if gutters:
+            start, end = max(gutters, key=lambda run: run[1] - run[0])
+            cut = (start + end) // 2
+            return (x, y, cut, h), (x + cut, y, w - cut, h)
+
+    if h < 2 * min_side:
+        return None
+    rows = cell.sum(axis=1)
+    gaps = _blank_runs(rows > max(1, w // 500), min_side, h - min_side)
+    if gaps:
+        start, end = min(gaps, key=lambda run: abs((run[0] + run[1]) // 2 - h // 2))
+        cut = (start + end) // 2
+        return (x, y, w, cut), (x, y + cut, w, h - cut)
+
+    # No clean break (e.g. skewed lines): cut through the sparsest row near
+    # the middle and overlap the tiles, so every line is whole in one of them
+    middle = slice(h // 4, 3 * h // 4)
+    cut = h // 4 + int(np.argmin(np.convolve(rows[middle], np.ones(9), mode="same")))
+    top, bottom = max(0, cut - overlap), min(h, cut + overlap)
+    return (x, y, w, bottom), (x, y + top, w, h - top)
+
+def split_tiles(
+    gray: np.ndarray,
+    max_tiles: int,
+    min_side: int = OCR_TILE_MIN_SIDE,
+    overlap: int = OCR_TILE_OVERLAP
+) -> List[Tile]:
+    """Split an enhanced text block into up to `max_tiles` tiles, in reading order.
+
+    A recursive XY-cut: the largest tile is cut along a column gutter if
+    it has one, else along the blank row nearest its middle, else through
+    its sparsest row with the two halves overlapping. Each cut replaces a
+    tile with its left/top then right/bottom half, which keeps the tiles
+    in reading order.
+    """
+    h, w = gray.shape[:2]
+    boxes: List[Box] = [(0, 0, w, h)]
+    if max_tiles > 1:
+        # Tiles are trimmed to their ink, so blank margins are neither cut
+        # into tiles of their own nor OCR'd
+        mask = ink_mask(gray)
+        boxes = [_trim_box(mask, boxes[0]) or boxes[0]]
+        while len(boxes) < max_tiles:
+            for i in sorted(range(len(boxes)), key=lambda i: boxes[i][2] * boxes[i][3], reverse=True):
+                halves = _split_box(mask, boxes[i], min_side, overlap)
+                if halves is not None:
+                    boxes[i:i + 1] = [box for box in (_trim_box(mask, half) for half in halves) if box is not None]
+                    break
+            else:
+                break
+    return [Tile(gray[y:y + bh, x:x + bw], (x, y, bw, bh)) for x, y, bw, bh in boxes]
+
+def _overlapping(a: Box, b: Box) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+def _join_overlap(first: str, second: str, window: int = 40) -> str:
+    """Join the texts of two overlapping tiles, keeping the words they share once.
+
+    Finds the longest run of words the end of `first` and the start of
+    `second` have in common, then keeps `first` up to the end of that run
+    and `second` from there on, dropping the lines cut through at the seam.
+    """
+    first_words, second_words = first.split(), second.split()
+    def normalize(words: List[str]) -> List[str]:
+        return [re.sub(r'\W', '', word.lower()) for word in words]
+
+    tail, head = normalize(first_words[-window:]), normalize(second_words[:window])
+    match = difflib.SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+    if match.size < 2:
+        return f"{first} {second}"
+    keep = len(first_words) - len(tail) + match.a + match.size
+    return " ".join(first_words[:keep] + second_words[match.b + match.size:])
+
+def stitch_tile_texts(texts: List[str], boxes: List[Optional[Box]]) -> str:
+    """Join the texts of a block's tiles, or of an image's blocks, in reading order"""
+    stitched, previous = "", None
+    for text, box in zip(texts, boxes):
+        if not text:
+            continue
+        if not stitched:
+            stitched = text
+        elif previous is not None and box is not None and _overlapping(previous, box):
+            stitched = _join_overlap(stitched, text)
+        else:
+            stitched = f"{stitched} {text}"
+        previous = box
+    return stitched
+
+def crop_and_enhance(image: np.ndarray, max_tiles: int = 1) -> List[List[Tile]]:
+    """Grayscale, enhanced crops of an upright image's text block(s), each split into tiles.
+
+    Blocks of at least OCR_TILE_MIN_PIXELS are split into up to
+    `max_tiles` tiles that can be OCR'd in parallel; smaller ones are a
+    single tile.
+    """
+    # Crop to the text block(s), so only they are upscaled and denoised
+    regions = crop_text_regions(image)
+
+    # Enhance resolution. Variants are built from grayscale, so only that
+    # needs to leave the worker
+    with stage("enhance"):
+        enhanced = [(to_grayscale(enhance_image(crop)), box) for crop, box in regions]
+    with stage("tile"):
+        return [
+            [
+                tile._replace(region=box)
+                for tile in split_tiles(crop, max_tiles if crop.size >= OCR_TILE_MIN_PIXELS else 1)
+            ]
+            for crop, box in enhanced
+        ]
+
+def select_psm(shape: Tuple[int, int], psm: Optional[int] = None) -> int:
+    """Auto-select a Tesseract page segmentation mode from the image size"""
+    if psm is not None:
+        return psm
+    h, w = shape[:2]
+    if max(h, w) > 1200:  # Larger images likely have multiple text blocks
+        return 3  # Multiple columns/paragraphs
+    elif h < 200 or w / h > 5:  # Very narrow image likely a single line
+        return 7  # Single text line
+    return 11  # Sparse text
+
+class TesseractOptions(NamedTuple):
+    """Per-request Tesseract settings"""
+    dpi: int
+    psm: int
+    language: str
+    oem: int = 3
+    whitelist: str = TESSERACT_WHITELIST
+
+    @property
+    def variables(self) -> Tuple[Tuple[str, str], ...]:
+        """Engine variables, which together with language/oem key the engine pool"""
+        return (("tessedit_char_whitelist", self.whitelist),)
+
+    def to_config(self) -> str:
+        """Tesseract CLI config with a properly escaped whitelist"""
+        escaped = self.whitelist.replace('\\', '\\\\').replace('"', '\\"')
+        return (
+            f"--dpi {self.dpi} "
+            f"--psm {self.psm} "
+            f"--oem {self.oem} "
+            f"-l {self.language} "
+            f"-c tessedit_char_whitelist=\"{escaped}\""
+        )
+
+class OCRReading(NamedTuple):
+    """Text and per-word confidences (0-100) from one Tesseract pass"""
+    text: str
+    confidences: List[float]
+
+    @property
+    def word_count(self) -> int:
+        return len(self.confidences)
+
+    @property
+    def mean_confidence(self) -> float:
+        return sum(self.confidences) / len(self.confidences) if self.confidences else 0.0
+
+    @property
+    def score(self) -> float:
+        """Confidence-weighted word count, used to rank readings"""
+        return sum(self.confidences) / 100
+
+def recognize(image: np.ndarray, options: TesseractOptions, name: str = "gray") -> OCRReading:
+    """OCR a single variant (`name` only labels its timing), keeping Tesseract's word confidences"""
+    with stage(f"tesseract.{name}"):
+        pool = get_engine_pool()
+        if pool is not None:
+            with pool.engine(options.language, options.oem, options.variables) as engine:
+                text, confidences = engine.recognize(image, options.psm, options.dpi)
+            return OCRReading(text.strip(), confidences)
+
+        data = pytesseract.image_to_data(image, config=options.to_config(), output_type=pytesseract.Output.DICT)
+
+        lines: Dict[Tuple[int, int, int], List[str]] = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            word = word.strip()
+            conf = float(data["conf"][i])
+            if not word or conf < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(conf)
+
+        text = "\n".join(" ".join(words) for words in lines.values())
+        return OCRReading(text, confidences)
+
+_PARENT_VARIANTS = {parent for parent, _ in VARIANT_STEPS.values()}
+
+def build_and_recognize(
+    parent: np.ndarray, name: str, options: TesseractOptions
+) -> Tuple[Optional[np.ndarray], OCRReading]:
+    """Build variant `name` from its parent and OCR it in one worker task.
+
+    The variant is only sent back when other variants are derived from it;
+    otherwise it is built in the worker's scratch buffer and dropped once read.
+    """
+    keep = name != VARIANT_ROOT and name in _PARENT_VARIANTS
+    if name == VARIANT_ROOT:
+        variant = parent
+    else:
+        dst = None if keep else scratch_buffer(parent.shape)
+        with stage(f"variant.{name}"):
+            variant = VARIANT_STEPS[name][1](parent, dst)
+    return (variant if keep else None), recognize(variant, options, name)
+
+def clean_text(text: str) -> str:
+    """Clean and normalize OCR output text"""
+    with stage("clean_text"):
+        # Remove excessive whitespace
+        cleaned = re.sub(r'\s+', ' ', text).strip()
+
+        # Fix common OCR errors
+        cleaned = re.sub(r'l\b', 'i', cleaned)  # Fix 'l' at end of words to 'i'
+        cleaned = re.sub(r'O', '0', cleaned)    # Fix 'O' to '0' in numbers
+        cleaned = re.sub(r'(\d),(\d)', r'\1.\2', cleaned)  # Fix comma to decimal in numbers
+
+        # Fix spacing around punctuation
+        cleaned = re.sub(r'\s+([,.;:)])', r'\1', cleaned)
+        cleaned = re.sub(r'([([])\s+', r'\1', cleaned)
+
+        # Fix sentence boundaries
+        cleaned = re.sub(r'([a-z])\.([A-Z])', r'\1. \2', cleaned)
+
+        return cleaned
+
+def merge_variant_texts(all_texts: List[str]) -> str:
+    """Pick the best text across variants, falling back to a word vote"""
+    with stage("vote"):
+        # Get the longest text (usually the most complete)
+        longest_text = max(all_texts, key=len)
+
+        # Clean up the text
+        cleaned_text = clean_text(longest_text)
+
+        # Check if the text is substantially different from other variants
+        # If so, use a voting mechanism to get the most likely correct text
+        if len(all_texts) > 1:
+            words = {}
+            for text in all_texts:
+                for word in re.findall(r'\b\w+\b', text.lower()):
+                    if len(word) > 2:  # Only count words with 3+ characters
+                        words[word] = words.get(word, 0) + 1
+
+            # If the longest text is missing many common words, combine texts
+            common_words = {word for word, count in words.items() if count > 1}
+            longest_words = set(re.findall(r'\b\w+\b', longest_text.lower()))
+
+            if len(common_words) > 0 and len(common_words - longest_words) > len(common_words) * 0.3:
+                # Combine all texts and clean
+                combined_text = ' '.join(all_texts)
+                cleaned_text = clean_text(combined_text)
+
+        return cleaned_text
+
+def init_ocr_worker(languages: List[str]) -> None:
+    """Load Tesseract engines for `languages` when an OCR worker starts"""
+    pool = get_engine_pool()
+    if pool is None:
+        return
+    for language in languages:
+        options = TesseractOptions(dpi=300, psm=3, language=language)
+        try:
+            pool.warm(options.language, options.oem, options.variables)
+        except RuntimeError as e:
+            logger.warning(f"Could not warm Tesseract engine: {str(e)}")
+    try:
+        pool.warm("osd", OEM_TESSERACT_ONLY)
+    except RuntimeError as e:
+        logger.warning(f"Could not warm Tesseract OSD engine: {str(e)}")
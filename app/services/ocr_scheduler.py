@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import numpy as np
+from typing import Callable, Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.config import (
+    OCR_DEFAULT_PROFILE,
+    OCR_EARLY_EXIT_CONFIDENCE,
+    OCR_EARLY_EXIT_MIN_WORDS,
+    OCR_LIVE_PROFILE
+)
+from app.services.ocr_executor import OCRExecutor, ocr_executor
+from app.services.ocr_pipeline import (
+    OCRReading,
+    TesseractOptions,
+    VARIANT_NAMES,
+    VARIANT_ROOT,
+    build_and_recognize,
+    build_variants,
+    clean_text,
+    downscale,
+    merge_variant_texts,
+    plan_variant_steps,
+    recognize,
+    variant_parent
+)
+
+logger = logging.getLogger(__name__)
+
+# Prior share of scans each variant gives the best reading on, before any
+# observations. Plain grayscale wins on most clean package photos; the
+# inverted thresholds only help with white-on-black text.
+VARIANT_PRIORS = {
+    "gray": 0.5,
+    "otsu": 0.45,
+    "adaptive": 0.35,
+    "sharpened": 0.3,
+    "denoised": 0.3,
+    "otsu_inverted": 0.1,
+    "adaptive_inverted": 0.1,
+}
+
+class VariantStats:
+    """Running estimate of how often each variant yields the best reading"""
+
+    def __init__(self, priors: Dict[str, float] = VARIANT_PRIORS, prior_weight: int = 10):
+        self.priors = priors
+        self.prior_weight = prior_weight
+        self.runs = dict.fromkeys(VARIANT_NAMES, 0)
+        self.wins = dict.fromkeys(VARIANT_NAMES, 0)
+
+    def expected_yield(self, name: str) -> float:
+        prior = self.priors.get(name, 0.0)
+        return (self.wins[name] + self.prior_weight * prior) / (self.runs[name] + self.prior_weight)
+
+    def ordered(self) -> List[str]:
+        """Variant names, most likely to give the best reading first"""
+        return sorted(VARIANT_NAMES, key=self.expected_yield, reverse=True)
+
+    def record(self, read: List[str], best: str) -> None:
+        for name in read:
+            self.runs[name] += 1
+        self.wins[best] += 1
+
+    def clear(self) -> None:
+        self.runs = dict.fromkeys(VARIANT_NAMES, 0)
+        self.wins = dict.fromkeys(VARIANT_NAMES, 0)
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "runs": self.runs[name],
+                "wins": self.wins[name],
+                "expected_yield": round(self.expected_yield(name), 3)
+            }
+            for name in self.ordered()
+        }
+
+variant_stats = VariantStats()
+
+def passes_quality_bar(reading: OCRReading, min_words: int = OCR_EARLY_EXIT_MIN_WORDS) -> bool:
+    return (
+        reading.word_count >= min_words
+        and reading.mean_confidence >= OCR_EARLY_EXIT_CONFIDENCE
+    )
+
+class VariantScan(NamedTuple):
+    """Readings of the variants that were OCR'd for one image"""
+    readings: Dict[str, OCRReading]
+    best: str
+    early_exit: bool
+
+    def text(self) -> str:
+        """Final cleaned text: the accepted reading, or a vote across all of them"""
+        if self.early_exit:
+            return clean_text(self.readings[self.best].text)
+        texts = [reading.text for reading in self.readings.values() if reading.text]
+        return merge_variant_texts(texts) if texts else ""
+
+async def scan_variants(
+    gray: np.ndarray,
+    options: TesseractOptions,
+    executor: OCRExecutor = ocr_executor,
+    stats: VariantStats = variant_stats,
+    on_reading: Optional[Callable[[str, OCRReading], None]] = None,
+    names: Optional[Sequence[str]] = None,
+    min_words: int = OCR_EARLY_EXIT_MIN_WORDS
+) -> VariantScan:
+    """OCR variants of `gray` in order of expected yield until one is good enough.
+
+    Variants are read in waves of 1, 2, 4, ... so a clean photo costs a single
+    Tesseract pass while hard ones still get parallelism. Variants are only
+    built when their wave comes up, reusing already built ancestors.
+    """
+    built: Dict[str, np.ndarray] = {VARIANT_ROOT: gray}
+    readings: Dict[str, OCRReading] = {}
+    pending = [name for name in stats.ordered() if names is None or name in names]
+    wave_size = 1
+    best: Optional[str] = None
+    early_exit = False
+
+    async def read(name: str) -> Tuple[Optional[np.ndarray], OCRReading]:
+        if name in built:
+            result = None, await executor.run(recognize, built[name], options, name)
+        else:
+            result = await executor.run(build_and_recognize, built[variant_parent(name)], name, options)
+        if on_reading is not None:
+            on_reading(name, result[1])
+        return result
+
+    while pending:
+        wave, pending = pending[:wave_size], pending[wave_size:]
+
+        # Build missing parents once here rather than in every task that needs them
+        parents = {variant_parent(name) for name in wave if name != VARIANT_ROOT}
+        plan = plan_variant_steps(parents, built)
+        if plan:
+            sources = {name: built[name] for name in {variant_parent(step) for step in plan} if name in built}
+            built.update(await executor.run(build_variants, sources, plan))
+
+        results = await asyncio.gather(*(read(name) for name in wave))
+        for name, (variant, reading) in zip(wave, results):
+            if variant is not None:
+                built[name] = variant
+            readings[name] = reading
+
+        best = max(readings, key=lambda name: readings[name].score)
+        if passes_quality_bar(readings[best], min_words):
+            early_exit = True
+            break
+        wave_size = min(wave_size * 2, executor.max_workers)
+
+    # Only full scans say which variant is best; a restricted one would
+    # credit its few variants with every win
+    if names is None:
+        stats.record(list(readings), best)
+    logger.info(
+        f"OCR read {len(readings)}/{len(VARIANT_NAMES)} variants, best={best} "
+        f"(confidence {readings[best].mean_confidence:.1f}, early_exit={early_exit})"
+    )
+    return VariantScan(readings, best, early_exit)
+
+class PyramidLevel(NamedTuple):
+    """One resolution a profile reads an image at, and the variants read there"""
+    max_side: Optional[int]  # None: the full enhanced image
+    variants: Optional[Tuple[str, ...]]  # None: all, in order of expected yield
+    # Words a confident reading needs to be accepted. At 1, a confident
+    # short reading (a product name, a logo) is kept rather than
+    # re-read through every variant hunting for more words.
+    min_words: int = OCR_EARLY_EXIT_MIN_WORDS
+
+ProfileName = Literal["fast", "balanced", "accurate"]
+
+# Quality profiles trade accuracy for latency. Every level but the last is
+# accepted only when its best reading passes the quality bar; otherwise the
+# scan escalates to the next level.
+#
+#   fast      one grayscale read at <=1200px (Tesseract binarizes it with
+#             Otsu itself, skipping the costly denoise chain)
+#   balanced  the same, escalating to every variant at <=1800px on low
+#             confidence
+#   accurate  every variant at full enhanced resolution until one passes
+#
+# End-to-end /ocr latency and character accuracy, measured on 24 synthetic
+# ingredient panels (TrueType text, 3000x2200, with blur, low contrast,
+# JPEG, shading or noise), 1 CPU, Tesseract C API:
+#
+#   profile    p50     p95     char accuracy
+#   fast       0.65 s  1.1 s   74%
+#   balanced   1.0 s   1.7 s   76%
+#   accurate   3.2 s   13 s    77%
+#
+# Clean panels read at ~99% under every profile; the differences come from
+# the degraded ones.
+OCR_PROFILES: Dict[str, Tuple[PyramidLevel, ...]] = {
+    "fast": (PyramidLevel(1200, ("gray",), 1),),
+    "balanced": (PyramidLevel(1200, ("gray",), 1), PyramidLevel(1800, None, 1)),
+    "accurate": (PyramidLevel(None, None),),
+}
+
+# A mistyped profile setting would fail every OCR request, so refuse to start
+for _setting, _profile in (("OCR_DEFAULT_PROFILE", OCR_DEFAULT_PROFILE), ("OCR_LIVE_PROFILE", OCR_LIVE_PROFILE)):
+    if _profile not in OCR_PROFILES:
+        raise ValueError(f"Unknown {_setting} '{_profile}', expected one of: {', '.join(OCR_PROFILES)}")
+
+async def scan_profile(
+    gray: np.ndarray,
+    options: TesseractOptions,
+    profile: ProfileName = "accurate",
+    executor: OCRExecutor = ocr_executor,
+    stats: VariantStats = variant_stats,
+    on_reading: Optional[Callable[[str, OCRReading], None]] = None,
+    full_side: Optional[int] = None
+) -> VariantScan:
+    """OCR `gray` under a quality profile, escalating through its pyramid levels.
+
+    When `gray` is a tile of a larger block, `full_side` is the block's
+    longest side: level sizes apply to the block, so the tile is scaled
+    as the whole block would be.
+    """
+    side = max(gray.shape[:2])
+    full_side = full_side or side
+    levels = OCR_PROFILES[profile]
+    for i, level in enumerate(levels):
+        last = i == len(levels) - 1
+        image = gray
+        if level.max_side is not None:
+            if full_side > level.max_side:
+                image = await executor.run(downscale, gray, side * level.max_side // full_side)
+            elif not last:
+                continue  # Already this small; a later level reads the same image
+        scan = await scan_variants(image, options, executor, stats, on_reading, level.variants, level.min_words)
+        if scan.early_exit or last:
+            return scan
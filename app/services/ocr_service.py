@@ -0,0 +1,387 @@
+import asyncio
+import math
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from app.core.config import (
+    OCR_CACHE_HASH_SIZE,
+    OCR_DEFAULT_PROFILE,
+    OCR_MAX_CONCURRENT_PAGES,
+    OCR_MAX_DECODE_PIXELS,
+    OCR_MAX_PAGES,
+    OCR_TILING
+)
+from app.services.ocr_cache import ocr_cache
+from app.services.ocr_executor import ocr_executor
+from app.services.ocr_memory import OCRBusyError, Size
+from app.services.ocr_pipeline import (
+    ImageTooLargeError,
+    InvalidImageError,
+    OCRReading,
+    TesseractOptions,
+    Tile,
+    clean_text,
+    count_pages,
+    crop_and_enhance,
+    decode_image,
+    image_size,
+    orient_image,
+    perceptual_hash,
+    prepare_image,
+    read_page,
+    select_psm,
+    stitch_tile_texts
+)
+from app.services.ocr_scheduler import ProfileName, VariantScan, scan_profile
+from app.services.ocr_timing import stage
+from app.services.single_flight import SingleFlight
+
+Fingerprint = Optional[Tuple[Tuple[int, int], int]]
+
+def _digest(contents: bytes) -> str:
+    """The upload's cache digest"""
+    # Refuse oversized uploads before hashing or decoding them; only the
+    # header is read, which is cheap enough for the event loop
+    image_size(contents)
+    return ocr_cache.digest(contents)
+
+def _lookup(digest: str, params: tuple) -> Optional[Dict[str, Any]]:
+    """Exact result cache lookup; rescans of the same product skip OCR entirely"""
+    with stage("cache"):
+        cached = ocr_cache.get(digest, params)
+    return dict(cached) if cached is not None else None
+
+async def _lookup_similar(contents: bytes, params: tuple) -> Tuple[Fingerprint, Optional[Dict[str, Any]]]:
+    """Perceptual result cache lookup, returning the fingerprint to store a fresh result under.
+
+    The hash decodes the upload in the pool, so call this inside
+    `ocr_executor.limit()`.
+    """
+    if not ocr_cache.enabled:
+        return None, None
+    with stage("cache"):
+        fingerprint = await ocr_executor.run(perceptual_hash, contents, OCR_CACHE_HASH_SIZE)
+        if fingerprint is None:
+            raise InvalidImageError("Invalid image format")
+        cached = ocr_cache.get_similar(*fingerprint, params)
+    return fingerprint, dict(cached) if cached is not None else None
+
+def _upload_size(contents: bytes) -> Size:
+    """An upload's size for its memory projection (taken as the whole decode budget if the header can't be read)"""
+    size = image_size(contents)
+    if size is None:
+        side = math.isqrt(OCR_MAX_DECODE_PIXELS)
+        return side, side
+    return size
+
+def _store(digest: str, fingerprint: Fingerprint, params: tuple, result: Dict[str, Any]) -> None:
+    size, phash = fingerprint if fingerprint else (None, None)
+    ocr_cache.put(digest, params, result, size, phash)
+
+def _block_size(tiles: List[Tile]) -> Tuple[int, int]:
+    """Width and height of the block `tiles` were cut from"""
+    boxes = [tile.box for tile in tiles]
+    return max(x + w for x, _, w, _ in boxes), max(y + h for _, y, _, h in boxes)
+
+def _max_tiles() -> int:
+    # One tile per pool worker, so a single large block keeps every core busy
+    return ocr_executor.max_workers if OCR_TILING else 1
+
+async def _scan_regions(
+    regions: List[List[Tile]],
+    dpi: int,
+    language: str,
+    psm: Optional[int],
+    profile: ProfileName,
+    on_reading: Optional[Callable[[int, int, str, OCRReading], None]] = None
+) -> List[List[VariantScan]]:
+    """OCR every tile of each region in parallel, each until one of its variants reads well enough"""
+    def tile_callback(region: int, tile: int) -> Optional[Callable[[str, OCRReading], None]]:
+        if on_reading is None:
+            return None
+        return lambda name, reading: on_reading(region, tile, name, reading)
+
+    scans = await asyncio.gather(*(
+        scan_profile(
+            tile.image,
+            TesseractOptions(dpi, select_psm(tile.image.shape, psm), language),
+            profile,
+            on_reading=tile_callback(i, j),
+            full_side=max(_block_size(tiles))
+        )
+        for i, tiles in enumerate(regions)
+        for j, tile in enumerate(tiles)
+    ))
+    # Regroup the flat list of tile scans by region
+    scans_iter = iter(scans)
+    return [[next(scans_iter) for _ in tiles] for tiles in regions]
+
+def _result(regions: List[List[Tile]], scans: List[List[VariantScan]]) -> Dict[str, Any]:
+    texts = [
+        stitch_tile_texts([scan.text() for scan in region_scans], [tile.box for tile in tiles])
+        for tiles, region_scans in zip(regions, scans)
+    ]
+    # Blocks are stitched like tiles, so a line read in two of them is kept once
+    text = stitch_tile_texts(texts, [tiles[0].region for tiles in regions])
+
+    # If no text was found in any variant
+    if not text:
+        return {"text": "", "success": False, "message": "No text detected in image"}
+    return {"text": text, "success": True}
+
+async def _ocr(
+    contents: bytes,
+    dpi: int,
+    language: str,
+    psm: Optional[int],
+    profile: ProfileName
+) -> Dict[str, Any]:
+    """The uncached pipeline; callers hold an OCR concurrency slot"""
+    # Decode, orient, crop to the text block(s), enhance and tile in the worker pool
+    regions = await ocr_executor.run(prepare_image, contents, _max_tiles())
+    if regions is None:
+        raise InvalidImageError("Invalid image format")
+
+    return _result(regions, await _scan_regions(regions, dpi, language, psm, profile))
+
+async def extract_text_uncached(
+    contents: bytes,
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
+) -> Dict[str, Any]:
+    """Run the OCR pipeline on image bytes without the result cache.
+
+    For live camera frames: a session already skips frames like the last
+    one it read, and frames seen once would only crowd uploads out of the
+    shared cache.
+    """
+    async with ocr_executor.limit([_upload_size(contents)]):
+        return await _ocr(contents, dpi, language, psm, profile)
+
+# Identical uploads being OCR'd at the same time (e.g. client retries after
+# a timeout) share one pipeline run
+ocr_flights = SingleFlight()
+
+async def extract_text(
+    contents: bytes,
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
+) -> Dict[str, Any]:
+    """Run the OCR pipeline on uploaded image bytes.
+
+    Returns {"text", "success"} plus a "message" when nothing was read.
+    Concurrent calls with the same bytes and params share one run.
+    """
+    params = (dpi, language, psm, profile)
+    digest = _digest(contents)
+    return dict(await ocr_flights.run((digest, params), lambda: _extract_text(contents, digest, params)))
+
+async def _extract_text(contents: bytes, digest: str, params: tuple) -> Dict[str, Any]:
+    cached = _lookup(digest, params)
+    if cached is not None:
+        return cached
+
+    async with ocr_executor.limit([_upload_size(contents)]):
+        fingerprint, cached = await _lookup_similar(contents, params)
+        if cached is not None:
+            return cached
+        result = await _ocr(contents, *params)
+
+    _store(digest, fingerprint, params, result)
+    return result
+
+async def extract_texts(
+    contents_list: List[bytes],
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
+) -> List[Union[Dict[str, Any], Exception]]:
+    """Run the OCR pipeline on several uploads as one unit of work.
+
+    The images share a single concurrency slot and their variants are
+    scheduled on the worker pool together. Returns one result per upload,
+    or the exception that upload failed with.
+    """
+    params = (dpi, language, psm, profile)
+    digests: List[Optional[str]] = []
+    results: List[Union[Dict[str, Any], Exception, None]] = []
+    for contents in contents_list:
+        try:
+            digest = _digest(contents)
+        except Exception as e:
+            digests.append(None)
+            results.append(e)
+        else:
+            digests.append(digest)
+            results.append(_lookup(digest, params))
+
+    misses = [i for i, result in enumerate(results) if result is None]
+    if not misses:
+        return results
+    async with ocr_executor.limit(_upload_size(contents_list[i]) for i in misses):
+        similar = await asyncio.gather(
+            *(_lookup_similar(contents_list[i], params) for i in misses), return_exceptions=True
+        )
+        fingerprints: Dict[int, Fingerprint] = {}
+        for i, lookup in zip(misses, similar):
+            if isinstance(lookup, Exception):
+                results[i] = lookup
+            else:
+                fingerprints[i], results[i] = lookup
+
+        misses = [i for i in misses if results[i] is None]
+        fresh = await asyncio.gather(
+            *(_ocr(contents_list[i], dpi, language, psm, profile) for i in misses),
+            return_exceptions=True
+        )
+    for i, result in zip(misses, fresh):
+        if not isinstance(result, Exception):
+            _store(digests[i], fingerprints[i], params, result)
+            result = dict(result)
+        results[i] = result
+    return results
+
+async def stream_text(
+    contents: bytes,
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run the OCR pipeline on uploaded image bytes, yielding progress events.
+
+    Yields "decoded", "orientation" and "enhanced" stage events, a
+    "variant" event with the partial text of every variant read, and
+    finally a "result" event carrying what `extract_text` would return.
+    Closing the generator early (e.g. the client disconnected) cancels the
+    remaining Tesseract work.
+    """
+    params = (dpi, language, psm, profile)
+    digest = _digest(contents)
+    cached = _lookup(digest, params)
+    if cached is not None:
+        yield {"event": "result", **cached, "cached": True}
+        return
+
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_reading(region: int, tile: int, name: str, reading: OCRReading) -> None:
+        events.put_nowait({
+            "event": "variant",
+            "region": region,
+            "tile": tile,
+            "variant": name,
+            "confidence": round(reading.mean_confidence, 1),
+            "words": reading.word_count,
+            "text": clean_text(reading.text) if reading.text else ""
+        })
+
+    async def run() -> Dict[str, Any]:
+        async with ocr_executor.limit([_upload_size(contents)]):
+            fingerprint, cached = await _lookup_similar(contents, params)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+            # The stages run as separate pool tasks so each can be reported.
+            # Decoding straight to grayscale keeps the image passed between
+            # them a third of the size.
+            image = await ocr_executor.run(decode_image, contents, True)
+            if image is None:
+                raise InvalidImageError("Invalid image format")
+            h, w = image.shape[:2]
+            events.put_nowait({"event": "decoded", "width": w, "height": h})
+
+            image, rotation = await ocr_executor.run(orient_image, image)
+            events.put_nowait({"event": "orientation", "rotation": rotation})
+
+            regions = await ocr_executor.run(crop_and_enhance, image, _max_tiles())
+            blocks = []
+            for tiles in regions:
+                width, height = _block_size(tiles)
+                blocks.append({"width": width, "height": height, "tiles": [list(tile.box) for tile in tiles]})
+            events.put_nowait({"event": "enhanced", "regions": blocks})
+
+            scans = await _scan_regions(regions, dpi, language, psm, profile, on_reading)
+        result = _result(regions, scans)
+        _store(digest, fingerprint, params, result)
+        return dict(result)
+
+    task = asyncio.create_task(run())
+    next_event = None
+    try:
+        while True:
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, task}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                yield next_event.result()
+                continue
+            next_event.cancel()
+            while not events.empty():
+                yield events.get_nowait()
+            yield {"event": "result", **task.result()}
+            return
+    finally:
+        # Cancelling the scan cancels its queued pool tasks, so an abandoned
+        # stream stops after the Tesseract calls already running
+        task.cancel()
+        if next_event is not None:
+            next_event.cancel()
+
+async def stream_pages(
+    contents: bytes,
+    dpi: int = 300,
+    language: str = "eng",
+    psm: Optional[int] = None,
+    profile: ProfileName = OCR_DEFAULT_PROFILE
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run the OCR pipeline on every page of a multi-page upload, yielding progress events.
+
+    Yields a "pages" event with the number of pages read (and how many the
+    upload has), then a "page" event per page as it finishes. Up to
+    OCR_MAX_CONCURRENT_PAGES pages are read at a time, each cut out of the
+    upload only when its turn comes and then read like an `extract_text`
+    call, so pages can finish out of order. Ends with a "result" event
+    joining the pages' text in page order. A page that can't be read, or
+    can't get into the memory budget in time, fails on its own. Closing
+    the generator early cancels the unread pages.
+    """
+    page_count = await ocr_executor.run(count_pages, contents)
+    pages = min(page_count, OCR_MAX_PAGES)
+    yield {"event": "pages", "pages": pages, "total": page_count}
+
+    turns = asyncio.Semaphore(OCR_MAX_CONCURRENT_PAGES)
+
+    async def read(index: int) -> Tuple[int, Dict[str, Any]]:
+        async with turns:
+            try:
+                page = contents
+                if page_count > 1:
+                    page = await ocr_executor.run(read_page, contents, index)
+                    if page is None:
+                        raise InvalidImageError("Invalid image format")
+                return index, await extract_text(page, dpi, language, psm, profile)
+            except (InvalidImageError, OCRBusyError) as e:
+                # One unreadable page, or one refused by the memory budget,
+                # shouldn't fail the whole document
+                return index, {"text": "", "success": False, "message": str(e)}
+
+    tasks = [asyncio.ensure_future(read(i)) for i in range(pages)]
+    results: List[Dict[str, Any]] = [{} for _ in range(pages)]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            index, result = await next_page
+            results[index] = result
+            yield {"event": "page", "page": index + 1, **result}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    text = " ".join(result["text"] for result in results if result["success"])
+    if not text:
+        yield {"event": "result", "text": "", "success": False, "pages": pages, "message": "No text detected in image"}
+        return
+    yield {"event": "result", "text": text, "success": True, "pages": pages}
@@ -0,0 +1,155 @@
+import bisect
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import OCR_TIMING_ENABLED
+
+# Stage timing for OCR requests. A request opens `request_timing()`; code on
+# its path wraps work in `stage(name)`. Work run in the OCR pool is timed in
+# the worker (see `timed_call`) and the entries merged back by the executor.
+# With timing disabled no timer is ever set, so `stage()` costs one
+# ContextVar lookup.
+#
+# Stages nest (e.g. "vote" wraps "clean_text"), so each records its
+# exclusive time: time spent in stages inside it, including those timed in
+# the pool, is left to them, and the stages of a request add up to its
+# time without counting anything twice. Nested stages that run in parallel
+# can add up to more than the stage around them, which then records 0.
+
+Stage = Tuple[str, float]  # name, seconds
+
+_current_timer: ContextVar[Optional["StageTimer"]] = ContextVar("ocr_stage_timer", default=None)
+# Seconds spent in stages nested inside the innermost open one
+_nested_seconds: ContextVar[Optional[List[float]]] = ContextVar("ocr_nested_seconds", default=None)
+_NOT_TIMING = nullcontext()
+
+class StageTimer:
+    """Stage durations recorded for one request, in the order they finished"""
+
+    def __init__(self):
+        self.stages: List[Stage] = []
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages.append((name, seconds))
+
+    def extend(self, stages: List[Stage]) -> None:
+        """Add stages timed elsewhere (in a pool worker) within the current stage"""
+        self.stages.extend(stages)
+        _add_nested(sum(seconds for _, seconds in stages))
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        """Total seconds and call count per stage name"""
+        totals: Dict[str, Tuple[float, int]] = {}
+        for name, seconds in self.stages:
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + seconds, count + 1)
+        return totals
+
+    def server_timing(self) -> str:
+        """The stages as a Server-Timing header value"""
+        metrics = []
+        for name, (seconds, count) in self.totals().items():
+            metric = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                metric += f';desc="{count} calls"'
+            metrics.append(metric)
+        return ", ".join(metrics)
+
+def _add_nested(seconds: float) -> None:
+    nested = _nested_seconds.get()
+    if nested is not None:
+        nested[0] += seconds
+
+@contextmanager
+def _measure(timer: StageTimer, name: str) -> Iterator[None]:
+    nested = [0.0]
+    token = _nested_seconds.set(nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _nested_seconds.reset(token)
+        timer.add(name, max(0.0, elapsed - nested[0]))
+        _add_nested(elapsed)
+
+def stage(name: str) -> ContextManager[None]:
+    """Time the enclosed block, less its nested stages, as stage `name` of the current request, if timed"""
+    timer = _current_timer.get()
+    if timer is None:
+        return _NOT_TIMING
+    return _measure(timer, name)
+
+def current_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+def timed_call(fn: Callable[..., Any], *args: Any) -> Tuple[Any, List[Stage]]:
+    """Run `fn(*args)` in an OCR worker, returning its result and the stages it timed"""
+    timer = StageTimer()
+    token = _current_timer.set(timer)
+    try:
+        return fn(*args), timer.stages
+    finally:
+        _current_timer.reset(token)
+
+class StageHistograms:
+    """Aggregated stage durations across requests, in fixed millisecond buckets"""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._stages: Dict[str, List[Any]] = {}  # name -> [count, sum_ms, bucket counts]
+
+    def observe(self, name: str, seconds: float) -> None:
+        ms = seconds * 1000
+        entry = self._stages.get(name)
+        if entry is None:
+            entry = self._stages[name] = [0, 0.0, [0] * (len(self.BUCKETS_MS) + 1)]
+        entry[0] += 1
+        entry[1] += ms
+        entry[2][bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+
+    def observe_timer(self, timer: StageTimer) -> None:
+        for name, seconds in timer.stages:
+            self.observe(name, seconds)
+
+    def snapshot(self) -> Dict[str, dict]:
+        snapshot = {}
+        for name, (count, sum_ms, buckets) in self._stages.items():
+            cumulative, counts = 0, {}
+            for bound, bucket in zip(self.BUCKETS_MS + ("+Inf",), buckets):
+                cumulative += bucket
+                counts[str(bound)] = cumulative
+            snapshot[name] = {
+                "count": count,
+                "sum_ms": round(sum_ms, 1),
+                "mean_ms": round(sum_ms / count, 1),
+                "buckets_ms": counts
+            }
+        return snapshot
+
+    def clear(self) -> None:
+        self._stages.clear()
+
+stage_histograms = StageHistograms()
+
+@contextmanager
+def request_timing(enabled: bool = OCR_TIMING_ENABLED) -> Iterator[Optional[StageTimer]]:
+    """Time the OCR stages run inside the block, yielding the timer (None when disabled).
+
+    On exit the stages, plus a "total", are added to `stage_histograms`.
+    """
+    if not enabled:
+        yield None
+        return
+    timer = StageTimer()
+    token = _current_timer.set(timer)
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+        timer.add("total", time.perf_counter() - start)
+        stage_histograms.observe_timer(timer)
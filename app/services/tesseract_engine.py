@@ -0,0 +1,234 @@
+import atexit
+import ctypes
+import ctypes.util
+import logging
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import OCR_TESSERACT_BACKEND, TESSERACT_LIBRARY, TESSDATA_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Bindings to libtesseract's C API, so OCR runs on long-lived engine handles
+# inside the worker process instead of forking the tesseract binary and
+# reloading its traineddata on every call. When the library can't be found
+# callers fall back to pytesseract.
+
+OEM_TESSERACT_ONLY = 0
+PSM_OSD_ONLY = 0
+
+EngineKey = Tuple[str, int, Tuple[Tuple[str, str], ...]]
+
+def _load_library() -> Optional[ctypes.CDLL]:
+    path = TESSERACT_LIBRARY or ctypes.util.find_library("tesseract")
+    if not path:
+        return None
+    try:
+        lib = ctypes.CDLL(path)
+    except OSError as e:
+        logger.warning(f"Could not load {path}: {str(e)}")
+        return None
+
+    handle = ctypes.c_void_p
+    lib.TessBaseAPICreate.restype = handle
+    lib.TessBaseAPICreate.argtypes = []
+    lib.TessBaseAPIDelete.restype = None
+    lib.TessBaseAPIDelete.argtypes = [handle]
+    lib.TessBaseAPIInit2.restype = ctypes.c_int
+    lib.TessBaseAPIInit2.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+    lib.TessBaseAPISetVariable.restype = ctypes.c_int
+    lib.TessBaseAPISetVariable.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p]
+    lib.TessBaseAPISetPageSegMode.restype = None
+    lib.TessBaseAPISetPageSegMode.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPISetImage.restype = None
+    lib.TessBaseAPISetImage.argtypes = [
+        handle, ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int
+    ]
+    lib.TessBaseAPISetSourceResolution.restype = None
+    lib.TessBaseAPISetSourceResolution.argtypes = [handle, ctypes.c_int]
+    # Returned strings/arrays are owned by us and freed with TessDelete*,
+    # so keep them as raw pointers rather than letting ctypes copy them.
+    lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+    lib.TessBaseAPIGetUTF8Text.argtypes = [handle]
+    lib.TessBaseAPIAllWordConfidences.restype = ctypes.POINTER(ctypes.c_int)
+    lib.TessBaseAPIAllWordConfidences.argtypes = [handle]
+    lib.TessBaseAPIDetectOrientationScript.restype = ctypes.c_int
+    lib.TessBaseAPIDetectOrientationScript.argtypes = [
+        handle,
+        ctypes.POINTER(ctypes.c_int),
+        ctypes.POINTER(ctypes.c_float),
+        ctypes.POINTER(ctypes.c_char_p),
+        ctypes.POINTER(ctypes.c_float),
+    ]
+    lib.TessBaseAPIClear.restype = None
+    lib.TessBaseAPIClear.argtypes = [handle]
+    lib.TessDeleteText.restype = None
+    lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+    lib.TessDeleteIntArray.restype = None
+    lib.TessDeleteIntArray.argtypes = [ctypes.POINTER(ctypes.c_int)]
+    return lib
+
+class TesseractEngine:
+    """An initialised TessBaseAPI handle for one language and config.
+
+    Not thread-safe: use one engine per thread at a time (EnginePool does).
+    """
+
+    def __init__(
+        self,
+        lib: ctypes.CDLL,
+        language: str,
+        oem: int,
+        variables: Tuple[Tuple[str, str], ...] = ()
+    ):
+        self._lib = lib
+        self._handle = lib.TessBaseAPICreate()
+        datapath = TESSDATA_PREFIX.encode() if TESSDATA_PREFIX else None
+        if lib.TessBaseAPIInit2(self._handle, datapath, language.encode(), oem) != 0:
+            lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+            raise RuntimeError(f"Could not initialise Tesseract for language '{language}'")
+        for name, value in variables:
+            lib.TessBaseAPISetVariable(self._handle, name.encode(), value.encode())
+
+    def _set_image(self, image: np.ndarray, psm: int, dpi: int) -> np.ndarray:
+        if len(image.shape) > 2:
+            # Tesseract expects RGB channel order
+            image = image[:, :, ::-1]
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        h, w = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        self._lib.TessBaseAPISetPageSegMode(self._handle, psm)
+        self._lib.TessBaseAPISetImage(
+            self._handle, image.ctypes.data, w, h, bytes_per_pixel, image.strides[0]
+        )
+        self._lib.TessBaseAPISetSourceResolution(self._handle, dpi)
+        # Tesseract reads from the buffer lazily, so the caller must keep it alive
+        return image
+
+    def recognize(self, image: np.ndarray, psm: int, dpi: int) -> Tuple[str, List[float]]:
+        """Return the page text and per-word confidences (0-100)"""
+        buffer = self._set_image(image, psm, dpi)
+        try:
+            text_ptr = self._lib.TessBaseAPIGetUTF8Text(self._handle)
+            text = ""
+            if text_ptr:
+                text = ctypes.string_at(text_ptr).decode("utf-8", errors="replace")
+                self._lib.TessDeleteText(text_ptr)
+
+            confidences: List[float] = []
+            conf_ptr = self._lib.TessBaseAPIAllWordConfidences(self._handle)
+            if conf_ptr:
+                i = 0
+                while conf_ptr[i] != -1:
+                    confidences.append(float(conf_ptr[i]))
+                    i += 1
+                self._lib.TessDeleteIntArray(conf_ptr)
+            return text, confidences
+        finally:
+            self._lib.TessBaseAPIClear(self._handle)
+            del buffer
+
+    def detect_orientation(self, image: np.ndarray, dpi: int = 300) -> Tuple[int, float]:
+        """Return the clockwise page orientation in degrees (0/90/180/270) and its confidence"""
+        buffer = self._set_image(image, PSM_OSD_ONLY, dpi)
+        try:
+            orient_deg = ctypes.c_int()
+            orient_conf = ctypes.c_float()
+            script_name = ctypes.c_char_p()
+            script_conf = ctypes.c_float()
+            ok = self._lib.TessBaseAPIDetectOrientationScript(
+                self._handle,
+                ctypes.byref(orient_deg),
+                ctypes.byref(orient_conf),
+                ctypes.byref(script_name),
+                ctypes.byref(script_conf)
+            )
+            if not ok:
+                raise RuntimeError("Tesseract orientation detection failed")
+            return orient_deg.value, orient_conf.value
+        finally:
+            self._lib.TessBaseAPIClear(self._handle)
+            del buffer
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+
+class EnginePool:
+    """Idle TesseractEngines kept per (language, oem, variables) and reused"""
+
+    def __init__(self, lib: ctypes.CDLL, max_idle_per_key: int = 2):
+        self._lib = lib
+        self.max_idle_per_key = max_idle_per_key
+        self._idle: Dict[EngineKey, List[TesseractEngine]] = {}
+        self._lock = threading.Lock()
+
+    def _take(self, key: EngineKey) -> TesseractEngine:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        language, oem, variables = key
+        logger.info(f"Initialising Tesseract engine for '{language}' (oem {oem})")
+        return TesseractEngine(self._lib, language, oem, variables)
+
+    def _give_back(self, key: EngineKey, engine: TesseractEngine) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(engine)
+                return
+        engine.close()
+
+    @contextmanager
+    def engine(
+        self,
+        language: str,
+        oem: int,
+        variables: Tuple[Tuple[str, str], ...] = ()
+    ) -> Iterator[TesseractEngine]:
+        key = (language, oem, variables)
+        engine = self._take(key)
+        try:
+            yield engine
+        finally:
+            self._give_back(key, engine)
+
+    def warm(self, language: str, oem: int, variables: Tuple[Tuple[str, str], ...] = ()) -> None:
+        """Initialise an engine ahead of the first request that needs it"""
+        with self.engine(language, oem, variables):
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            engines = [engine for idle in self._idle.values() for engine in idle]
+            self._idle.clear()
+        for engine in engines:
+            engine.close()
+
+_engine_pool: Optional[EnginePool] = None
+_engine_pool_lock = threading.Lock()
+_library_missing = False
+
+def get_engine_pool() -> Optional[EnginePool]:
+    """This process's engine pool, or None when OCR should go through the CLI"""
+    global _engine_pool, _library_missing
+    if _engine_pool is not None or _library_missing:
+        return _engine_pool
+    with _engine_pool_lock:
+        if _engine_pool is None and not _library_missing:
+            lib = _load_library() if OCR_TESSERACT_BACKEND != "cli" else None
+            if lib is None:
+                if OCR_TESSERACT_BACKEND == "capi":
+                    raise RuntimeError("OCR_TESSERACT_BACKEND=capi but libtesseract could not be loaded")
+                if OCR_TESSERACT_BACKEND != "cli":
+                    logger.info("libtesseract not found, falling back to the tesseract CLI")
+                _library_missing = True
+            else:
+                _engine_pool = EnginePool(lib)
+                atexit.register(_engine_pool.close)
+    return _engine_pool
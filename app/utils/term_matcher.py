@@ -0,0 +1,74 @@
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from app.core.constants import INGREDIENTS
+
+def lowercase(text: str) -> Tuple[str, Optional[List[int]]]:
+    """The text lowercased, and the index in `text` of each of its characters if that moved them"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered, None
+    # A few characters lowercase to more than one (e.g. "İ")
+    return lowered, [i for i, ch in enumerate(text) for _ in ch.lower()]
+
+class TermMatcher:
+    """Aho-Corasick automaton finding every term of a labelled lexicon in one pass.
+
+    Matching is case-insensitive and by substring, like `term in text`, and
+    reports offsets into the text as given. A scan costs the same however
+    many terms the lexicon has.
+    """
+
+    def __init__(self, lexicon: Dict[str, List[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]  # (term length, label) ending at each state
+
+        for label, terms in lexicon.items():
+            for term in terms:
+                term = term.lower()
+                state = 0
+                for ch in term:
+                    next_state = self._goto[state].get(ch)
+                    if next_state is None:
+                        next_state = self._goto[state][ch] = len(self._goto)
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._out.append([])
+                    state = next_state
+                self._out[state].append((len(term), label))
+
+        # Breadth-first, so each state's fail link is final before its children's;
+        # a state also reports every match its fail link does
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0) if state else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def find(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yield (start, end, label) for every term occurrence, overlapping ones included"""
+        goto, fail, out = self._goto, self._fail, self._out
+        lowered, index = lowercase(text)
+        state = 0
+        for i, ch in enumerate(lowered):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, label in out[state]:
+                if index is None:
+                    yield i + 1 - length, i + 1, label
+                else:
+                    yield index[i + 1 - length], index[i] + 1, label
+
+    def labels_in(self, text: str) -> Set[str]:
+        """Labels with at least one term occurring in `text`"""
+        return {label for _, _, label in self.find(text)}
+
+# The allergen lexicon, compiled once
+ingredient_matcher = TermMatcher(INGREDIENTS)
@@ -1,4 +1,58 @@
+from functools import lru_cache
+from typing import NamedTuple
 from app.core.constants import INGREDIENTS, INDIRECT_ALLERGEN_SOURCES
+from app.utils.term_matcher import ingredient_matcher, lowercase
+
+Span = tuple[int, int]  # start, end
+
+class Evidence(NamedTuple):
+    text: str  # as reported, e.g. "Contains statement: milk"
+    start: int  # where it was found in the text, for highlighting
+    end: int
+
+@lru_cache(maxsize=4096)
+def allergens_in(fragment: str) -> frozenset[str]:
+    """Allergen categories with a lexicon term in the fragment.
+
+    Common ingredients ("sugar", "salt") recur across products, so
+    lookups are cached.
+    """
+    return frozenset(ingredient_matcher.labels_in(fragment))
+
+def extract_evidence(text: str) -> dict[str, list[Evidence]]:
+    """Evidence for every allergen category found in the text, in one pass.
+
+    The text is split into ingredients, contains and may-contain sections
+    once, and each item checked for all categories together. Spans are
+    offsets into `text` as given.
+    """
+    lowered, index = lowercase(text)
+    sections = _parse_sections(lowered)
+    found: dict[str, list[Evidence]] = {}
+
+    def add(allergen: str, message: str, start: int, end: int) -> None:
+        if allergen not in INGREDIENTS:
+            return
+        if index is not None:
+            start, end = index[start], index[end - 1] + 1
+        found.setdefault(allergen, []).append(Evidence(message, start, end))
+
+    # Direct and indirect matches in the ingredients
+    for start, end in sections['ingredients']:
+        ingredient = lowered[start:end]
+        for allergen in allergens_in(ingredient):
+            add(allergen, ingredient, start, end)
+        for allergen, message, source_start, source_end in _indirect_sources(ingredient):
+            add(allergen, message, start + source_start, start + source_end)
+
+    # Contains and may contain statements
+    for prefix, section in (("Contains statement", 'contains'), ("May contain", 'may_contain')):
+        for start, end in sections[section]:
+            statement = lowered[start:end]
+            for allergen in allergens_in(statement):
+                add(allergen, f"{prefix}: {statement}", start, end)
+
+    return found
 
 def get_evidence(text: str, allergen: str) -> list[str] | None:
     # Skip evidence gathering for 'none' category or empty allergen
@@ -10,105 +64,100 @@ def get_evidence(text: str, allergen: str) -> list[str] | None:
         print(f"Warning: Unknown allergen category '{allergen}'")
         return None
     
-    # Clean and normalize the text
-    text = text.lower()
-    
-    # Parse text sections
-    parts = parse_ingredient_text(text)
-    
-    # Look for allergen terms in all parts
-    evidence = []
-    allergen_terms = INGREDIENTS[allergen]
-    
-    # Check direct ingredients
-    for ingredient in parts['ingredients']:
-        # Direct match
-        if any(term.lower() in ingredient.lower() for term in allergen_terms):
-            evidence.append(ingredient)
-        # Check indirect sources
-        indirect_evidence = check_indirect_allergens(ingredient)
-        for ind_allergen, ind_evidence in indirect_evidence:
-            if ind_allergen == allergen:
-                evidence.append(ind_evidence)
-    
-    # Check contains statements
-    evidence.extend(check_contains_statements(parts['contains'], allergen_terms))
-    evidence.extend(check_may_contain_statements(parts['may_contain'], allergen_terms))
+    evidence = extract_evidence(text).get(allergen)
+    return [e.text for e in evidence] if evidence else None
+
+def _after(text: str, marker: str) -> Span | None:
+    """Span of text.split(marker)[1]: from the first marker to the next one, or the end"""
+    i = text.find(marker)
+    if i < 0:
+        return None
+    start = i + len(marker)
+    end = text.find(marker, start)
+    return start, len(text) if end < 0 else end
+
+def _until(text: str, span: Span, marker: str) -> Span:
+    """Span of the part of `span` before `marker` (split(marker)[0])"""
+    start, end = span
+    i = text.find(marker, start, end)
+    return start, end if i < 0 else i
+
+def _items(text: str, span: Span) -> list[Span]:
+    """Spans of the stripped comma-separated items in `span`"""
+    items = []
+    start, end = span
+    while True:
+        comma = text.find(',', start, end)
+        stop = end if comma < 0 else comma
+        item = text[start:stop]
+        item_start = start + len(item) - len(item.lstrip())
+        items.append((item_start, max(item_start, start + len(item.rstrip()))))
+        if comma < 0:
+            return items
+        start = comma + 1
+
+def _parse_sections(text: str) -> dict[str, list[Span]]:
+    """Spans of the items in each section of lowercased label text"""
+    ingredients = _after(text, 'ingredients:')
+    ingredients = _until(text, ingredients, 'contains') if ingredients else (0, len(text))
+    sections = {'ingredients': _items(text, ingredients), 'contains': [], 'may_contain': []}
     
-    return evidence if evidence else None
+    # Contains runs up to a may contain statement, which runs to the end of its sentence
+    contains = _after(text, 'contains')
+    if contains:
+        sections['contains'] = _items(text, _until(text, contains, 'may contain'))
+    may_contain = _after(text, 'may contain')
+    if may_contain:
+        sections['may_contain'] = _items(text, _until(text, may_contain, '.'))
+    return sections
 
 def parse_ingredient_text(text: str) -> dict:
-    parts = {
-        'ingredients': [],
-        'contains': [],
-        'may_contain': []
+    return {
+        section: [text[start:end] for start, end in spans]
+        for section, spans in _parse_sections(text).items()
     }
-    
-    # Parse sections
-    if 'ingredients:' in text:
-        ingredients_part = text.split('ingredients:')[1].split('contains')[0]
-        parts['ingredients'] = [i.strip() for i in ingredients_part.split(',')]
-    else:
-        parts['ingredients'] = [i.strip() for i in text.split(',')]
-    
-    # Parse contains statements
-    if 'contains' in text:
-        try:
-            contains_part = text.split('contains')[1].split('may contain')[0]
-            parts['contains'] = [i.strip() for i in contains_part.split(',')]
-        except IndexError:
-            contains_part = text.split('contains')[1].split('.')[0]
-            parts['contains'] = [i.strip() for i in contains_part.split(',')]
-    
-    # Parse may contain statements
-    if 'may contain' in text:
-        try:
-            may_contain_part = text.split('may contain')[1].split('.')[0]
-            parts['may_contain'] = [i.strip() for i in may_contain_part.split(',')]
-        except IndexError:
-            may_contain_part = text.split('may contain')[1]
-            parts['may_contain'] = [i.strip() for i in may_contain_part.split(',')]
-    
-    return parts
 
-def check_ingredients(ingredients: list[str], allergen_terms: list[str]) -> list[str]:
+def check_ingredients(ingredients: list[str], allergen: str) -> list[str]:
     return [
         ing for ing in ingredients
-        if any(term.lower() in ing.lower() for term in allergen_terms)
+        if allergen in allergens_in(ing)
     ]
 
-def check_contains_statements(statements: list[str], allergen_terms: list[str]) -> list[str]:
+def check_contains_statements(statements: list[str], allergen: str) -> list[str]:
     return [
         f"Contains statement: {stmt}" for stmt in statements
-        if any(term.lower() in stmt.lower() for term in allergen_terms)
+        if allergen in allergens_in(stmt)
     ]
 
-def check_may_contain_statements(statements: list[str], allergen_terms: list[str]) -> list[str]:
+def check_may_contain_statements(statements: list[str], allergen: str) -> list[str]:
     return [
         f"May contain: {stmt}" for stmt in statements
-        if any(term.lower() in stmt.lower() for term in allergen_terms)
+        if allergen in allergens_in(stmt)
     ]
 
 def check_indirect_allergens(ingredient: str) -> list[tuple[str, str]]:
+    return [(allergen, message) for allergen, message, _, _ in _indirect_sources(ingredient)]
+
+def _indirect_sources(ingredient: str) -> list[tuple[str, str, int, int]]:
+    """Allergens an ingredient may be a source of, with where the source is named in it"""
     evidence = []
     
     # Check emulsifiers
     if 'INS' in ingredient:
         code = ingredient.split('INS')[1].strip().split(')')[0].strip()
         if code in INDIRECT_ALLERGEN_SOURCES['emulsifiers']:
+            start = ingredient.find(code, ingredient.find('INS'))
             for allergen in INDIRECT_ALLERGEN_SOURCES['emulsifiers'][code]:
-                evidence.append((allergen, f"May contain {allergen} (from emulsifier {code})"))
-    
-    # Check flavorings
-    for flavor_type, allergens in INDIRECT_ALLERGEN_SOURCES['flavoring'].items():
-        if flavor_type.lower() in ingredient.lower():
-            for allergen in allergens:
-                evidence.append((allergen, f"May contain {allergen} (from {flavor_type})"))
+                evidence.append((allergen, f"May contain {allergen} (from emulsifier {code})", start, start + len(code)))
     
-    # Check starches
-    for starch, allergens in INDIRECT_ALLERGEN_SOURCES['starches'].items():
-        if starch.lower() in ingredient.lower():
+    # Check flavorings and starches
+    lowered = ingredient.lower()
+    for source_type in ('flavoring', 'starches'):
+        for source, allergens in INDIRECT_ALLERGEN_SOURCES[source_type].items():
+            start = lowered.find(source.lower())
+            if start < 0:
+                continue
             for allergen in allergens:
-                evidence.append((allergen, f"May contain {allergen} (from {starch})"))
+                evidence.append((allergen, f"May contain {allergen} (from {source})", start, start + len(source)))
                 
-    return evidence 
\ No newline at end of file
+    return evidence
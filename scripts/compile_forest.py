@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Compile the allergen model's random forests into flat arrays.
+
+Loads model/allergen_model.pkl, flattens it with CompiledForest, checks the
+compiled predictions against the model's predict_proba on the ingredient
+texts in data/allergen_dataset.csv, and saves model/allergen_forest.npz for
+the API to load instead of the pickle. Run it after retraining the model.
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import COMPILED_FOREST_PATH, DATA_DIR, MODEL_PATH, VECTORIZER_PATH
+from app.services.compiled_forest import CompiledForest
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, default=COMPILED_FOREST_PATH)
+    parser.add_argument("--dataset", type=Path, default=DATA_DIR / "allergen_dataset.csv")
+    parser.add_argument("--samples", type=int, default=500, help="dataset texts to verify on")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="largest allowed probability difference")
+    args = parser.parse_args()
+
+    model = joblib.load(MODEL_PATH)
+    tfidf = joblib.load(VECTORIZER_PATH)
+
+    start = time.perf_counter()
+    forest = CompiledForest.compile(model)
+    print(f"Compiled {forest.roots.size} trees ({forest.feature.size} nodes, {forest.features.size} features used) "
+          f"into {forest.nbytes() / 2**20:.1f} MB in {time.perf_counter() - start:.2f}s")
+
+    with open(args.dataset, newline="") as f:
+        texts = [row["ingredient_text"] for _, row in zip(range(args.samples), csv.DictReader(f))]
+    X = tfidf.transform(texts)
+
+    start = time.perf_counter()
+    expected = model.predict_proba(X)
+    model_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = forest.predict_proba(X)
+    forest_seconds = time.perf_counter() - start
+
+    difference = max(float(np.abs(e - a).max()) for e, a in zip(expected, actual))
+    print(f"{len(texts)} texts: predict_proba {model_seconds:.3f}s, compiled {forest_seconds:.3f}s, "
+          f"max difference {difference:.2e}")
+    if difference > args.tolerance:
+        print(f"Compiled forest differs from the model by more than {args.tolerance}, not saving it")
+        return 1
+
+    forest.save(args.output)
+    print(f"Saved {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Benchmark the OCR pipeline on synthetic ingredient-label images.
+
+Ingredient texts from data/allergen_dataset.csv are rendered with Pillow
+into label-like photos (varied fonts, sizes, skew, blur, noise, rotation and
+low contrast), run through the uncached /ocr pipeline, and compared with
+the text that was rendered. Reports the pipeline's own per-stage latency
+(p50/p95), CPU time, peak memory and character/word accuracy. Everything
+runs offline. The same --seed and fonts always render the same corpus, so
+the report records the SHA-256 of every font used.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import DATA_DIR
+from app.services.ocr_executor import ocr_executor
+from app.services.ocr_scheduler import OCR_PROFILES, variant_stats
+from app.services.ocr_service import _ocr
+from app.services.ocr_timing import request_timing
+
+FONT_DIRS = [
+    Path("/usr/share/fonts"),
+    Path("/usr/local/share/fonts"),
+    Path.home() / ".fonts",
+    Path("/Library/Fonts"),
+    Path("/System/Library/Fonts"),
+    Path("C:/Windows/Fonts"),
+]
+
+class Sample(NamedTuple):
+    """One rendered label and the text printed on it"""
+    index: int
+    text: str
+    image: bytes
+    degradations: List[str]
+
+def find_fonts(font_dirs: Sequence[Path]) -> List[Path]:
+    """TrueType/OpenType fonts installed locally, in a stable order"""
+    fonts = set()
+    for font_dir in font_dirs:
+        if font_dir.is_dir():
+            fonts.update(font_dir.rglob("*.ttf"))
+            fonts.update(font_dir.rglob("*.otf"))
+    return sorted(fonts)
+
+def font_digests(fonts: List[Path]) -> Dict[str, str]:
+    """SHA-256 of each font file, so a report shows which fonts rendered its corpus"""
+    return {str(font): hashlib.sha256(font.read_bytes()).hexdigest() for font in fonts}
+
+def load_font(fonts: List[Path], rng: np.random.Generator, size: int) -> ImageFont.ImageFont:
+    if fonts:
+        return ImageFont.truetype(str(fonts[rng.integers(len(fonts))]), size)
+    # Pillow's bundled font, so the benchmark runs with no fonts installed
+    return ImageFont.load_default(size)
+
+def load_texts(path: Path) -> List[str]:
+    with open(path, newline="") as f:
+        return [row["ingredient_text"] for row in csv.DictReader(f) if row["ingredient_text"]]
+
+def wrap(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont, width: int) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if line and draw.textlength(candidate, font=font) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    return lines + [line] if line else lines
+
+def render_label(text: str, fonts: List[Path], rng: np.random.Generator) -> Sample:
+    """Render `text` as a photographed ingredient panel with random degradations"""
+    if not text.lower().startswith("ingredients"):
+        text = "Ingredients: " + text
+    if rng.random() < 0.2:
+        text = text.upper()
+
+    size = int(rng.integers(26, 64))
+    font = load_font(fonts, rng, size)
+    width = int(rng.integers(1600, 2600))
+    paper = tuple(int(c) for c in rng.integers(200, 256, 3))
+    ink = tuple(int(c) for c in rng.integers(0, 60, 3))
+
+    measure = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    lines = wrap(measure, text, font, int(width * 0.8))
+    line_height = int(size * 1.4)
+    height = max(int(width * 0.6), line_height * len(lines) + 4 * size)
+
+    image = Image.new("RGB", (width, height), paper)
+    draw = ImageDraw.Draw(image)
+    y = int(rng.integers(size, max(size + 1, height - line_height * len(lines) - size)))
+    for line in lines:
+        draw.text((int(width * 0.08), y), line, fill=ink, font=font)
+        y += line_height
+
+    degradations = []
+    image = image.rotate(float(rng.uniform(-4, 4)), resample=Image.BICUBIC, expand=True, fillcolor=paper)
+    if rng.random() < 0.3:
+        degradations.append("blur")
+        image = image.filter(ImageFilter.GaussianBlur(float(rng.uniform(0.8, 2.0))))
+    pixels = np.asarray(image).astype(np.float32)
+    if rng.random() < 0.3:
+        degradations.append("low_contrast")
+        factor = rng.uniform(0.35, 0.7)
+        pixels = pixels * factor + (1 - factor) * pixels.mean()
+    if rng.random() < 0.3:
+        degradations.append("noise")
+        pixels += rng.normal(0, rng.uniform(5, 20), pixels.shape)
+    pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+    if rng.random() < 0.2:
+        rotation = int(rng.choice([90, 180, 270]))
+        degradations.append(f"rotated_{rotation}")
+        pixels = np.ascontiguousarray(np.rot90(pixels, k=-rotation // 90))
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=int(rng.integers(80, 96)))
+    return Sample(0, text, buffer.getvalue(), degradations or ["clean"])
+
+def build_corpus(dataset: Path, samples: int, seed: int, fonts: List[Path]) -> List[Sample]:
+    rng = np.random.default_rng(seed)
+    texts = load_texts(dataset)
+    picks = rng.choice(len(texts), size=min(samples, len(texts)), replace=False)
+    return [render_label(texts[i], fonts, rng)._replace(index=int(i)) for i in picks]
+
+def edit_distance(a: Sequence, b: Sequence) -> int:
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+def normalize(text: str) -> str:
+    # clean_text maps O to 0, so compare case- and O/0-insensitively
+    return " ".join(text.lower().replace("0", "o").split())
+
+def accuracy(predicted: str, truth: str) -> Dict[str, float]:
+    predicted, truth = normalize(predicted), normalize(truth)
+    chars = 1 - edit_distance(predicted, truth) / max(1, len(truth))
+    words = 1 - edit_distance(predicted.split(), truth.split()) / max(1, len(truth.split()))
+    return {"char_accuracy": max(0.0, chars), "word_accuracy": max(0.0, words)}
+
+async def run_sample(sample: Sample, profile: str) -> Dict:
+    """Run one image through the uncached /ocr pipeline, timed by its own stages"""
+    cpu_start = time.process_time()
+    tracemalloc.reset_peak()
+    with request_timing(enabled=True) as timer:
+        result = await _ocr(sample.image, 300, "eng", None, profile)
+    timings = {name: seconds for name, (seconds, _) in timer.totals().items()}
+    text = result["text"]
+
+    return {
+        "index": sample.index,
+        "degradations": sample.degradations,
+        "timings": timings,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "peak_traced_mb": tracemalloc.get_traced_memory()[1] / 2 ** 20,
+        **accuracy(text, sample.text),
+        "text": text,
+        "truth": sample.text
+    }
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def summarize(results: List[Dict]) -> Dict:
+    # Stages a sample skipped (e.g. a variant it never built) count as 0
+    names = sorted({name for r in results for name in r["timings"]} - {"total"}) + ["total"]
+    stages = {
+        stage: {
+            "p50_ms": 1000 * percentile([r["timings"].get(stage, 0.0) for r in results], 0.5),
+            "p95_ms": 1000 * percentile([r["timings"].get(stage, 0.0) for r in results], 0.95)
+        }
+        for stage in names
+    }
+    by_degradation = defaultdict(list)
+    for r in results:
+        for name in r["degradations"]:
+            by_degradation[name].append(r["char_accuracy"])
+    return {
+        "samples": len(results),
+        "stages": stages,
+        "cpu_seconds_mean": statistics.mean(r["cpu_seconds"] for r in results),
+        "peak_traced_mb_max": max(r["peak_traced_mb"] for r in results),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "char_accuracy": statistics.mean(r["char_accuracy"] for r in results),
+        "word_accuracy": statistics.mean(r["word_accuracy"] for r in results),
+        "char_accuracy_by_degradation": {
+            name: statistics.mean(values) for name, values in sorted(by_degradation.items())
+        }
+    }
+
+def print_summary(profile: str, summary: Dict) -> None:
+    print(f"\nProfile {profile} ({summary['samples']} images)")
+    print(f"  {'stage':<24} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, timing in summary["stages"].items():
+        print(f"  {stage:<24} {timing['p50_ms']:>9.1f} {timing['p95_ms']:>9.1f}")
+    print(f"  CPU time per image: {summary['cpu_seconds_mean']:.2f} s")
+    print(f"  Peak traced memory: {summary['peak_traced_mb_max']:.1f} MB (process peak RSS {summary['peak_rss_mb']:.0f} MB)")
+    print(f"  Accuracy: {summary['char_accuracy']:.1%} chars, {summary['word_accuracy']:.1%} words")
+    for name, value in summary["char_accuracy_by_degradation"].items():
+        print(f"    {name:<14} {value:.1%}")
+
+async def benchmark(corpus: List[Sample], profiles: List[str], workers: int) -> Dict[str, Dict]:
+    # The production executor, but on threads so tracemalloc sees the
+    # pipeline's allocations; it also sets how many tiles a block is cut into
+    ocr_executor.kind, ocr_executor.max_workers = "thread", workers
+    report = {}
+    tracemalloc.start()
+    try:
+        for profile in profiles:
+            # Fresh statistics per profile so variant order doesn't depend on
+            # what ran before
+            variant_stats.clear()
+            results = [await run_sample(sample, profile) for sample in corpus]
+            report[profile] = {"summary": summarize(results), "results": results}
+            print_summary(profile, report[profile]["summary"])
+    finally:
+        tracemalloc.stop()
+        ocr_executor.shutdown()
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=50, help="images to render")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+    parser.add_argument("--profiles", default="accurate", help=f"comma-separated, of {', '.join(OCR_PROFILES)}")
+    parser.add_argument("--dataset", type=Path, default=DATA_DIR / "allergen_dataset.csv")
+    parser.add_argument("--fonts", type=Path, action="append", help="font directory (default: system font directories)")
+    parser.add_argument("--workers", type=int, default=1, help="OCR threads")
+    parser.add_argument("--save-images", type=Path, help="also write the rendered images here")
+    parser.add_argument("--output", type=Path, help="write the full report as JSON")
+    args = parser.parse_args()
+
+    profiles = [profile for profile in args.profiles.split(",") if profile]
+    unknown = set(profiles) - set(OCR_PROFILES)
+    if unknown:
+        parser.error(f"unknown profile(s): {', '.join(sorted(unknown))}")
+
+    fonts = find_fonts(args.fonts or FONT_DIRS)
+    digests = font_digests(fonts)
+    corpus = build_corpus(args.dataset, args.samples, args.seed, fonts)
+    # One digest over the whole font set; runs with the same seed and font
+    # set digest rendered the same corpus
+    font_set = hashlib.sha256("".join(digests.values()).encode()).hexdigest()[:12]
+    print(f"Rendered {len(corpus)} labels with {len(fonts) or 'the default'} font(s) (font set {font_set}), seed {args.seed}")
+
+    if args.save_images:
+        args.save_images.mkdir(parents=True, exist_ok=True)
+        for n, sample in enumerate(corpus):
+            (args.save_images / f"{n:04d}_{'-'.join(sample.degradations)}.jpg").write_bytes(sample.image)
+            (args.save_images / f"{n:04d}.txt").write_text(sample.text)
+
+    report = asyncio.run(benchmark(corpus, profiles, args.workers))
+
+    if args.output:
+        args.output.write_text(json.dumps({
+            "seed": args.seed,
+            "samples": len(corpus),
+            "font_set": font_set,
+            "fonts": digests,
+            "profiles": report
+        }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Run OCR job workers separately from the API process.
+
+Each worker process claims jobs from the shared queue (OCR_JOB_BACKEND=sqlite)
+and runs the OCR pipeline on a small thread pool of its own. Set
+OCR_JOB_EXTERNAL_WORKERS=true for the API so it stops running a worker itself.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+def run_process(index: int, threads: int) -> None:
+    # The worker processes are the parallelism, so OCR stages inside each one
+    # run on threads (cv2 and the Tesseract C API release the GIL)
+    os.environ["OCR_EXECUTOR"] = "thread"
+    os.environ["OCR_POOL_WORKERS"] = str(threads)
+
+    from app.services.ocr_job_queue import get_job_queue, run_worker
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await run_worker(get_job_queue(), f"{os.uname().nodename}-{os.getpid()}-{index}", stop)
+
+    asyncio.run(main())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="OCR threads per worker process")
+    args = parser.parse_args()
+
+    if os.getenv("OCR_JOB_BACKEND", "sqlite") != "sqlite":
+        sys.exit("Separate worker processes need OCR_JOB_BACKEND=sqlite")
+
+    processes = [
+        multiprocessing.Process(target=run_process, args=(i, args.threads), name=f"ocr-worker-{i}")
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Started {len(processes)} OCR workers")
+
+    # Workers stop on SIGINT/SIGTERM themselves; just pass it on and wait
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
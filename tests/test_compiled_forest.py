@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.multioutput import MultiOutputClassifier
+
+from app.services.compiled_forest import CompiledForest
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(0)
+    X = rng.random((300, 40))
+    # Labels that depend on a few features each, so trees split on some of them only
+    Y = np.column_stack([
+        X[:, 0] + X[:, 3] > 1,
+        X[:, 10] > 0.7,
+        (X[:, 5] > 0.5) ^ (X[:, 20] > 0.5)
+    ]).astype(int)
+    model = MultiOutputClassifier(RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0))
+    model.fit(X, Y)
+    return model, rng.random((150, 40))
+
+def assert_same_proba(compiled, model, X):
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a.shape == e.shape
+        np.testing.assert_allclose(a, e, rtol=0, atol=1e-12)
+
+def test_matches_sklearn(fitted):
+    model, X = fitted
+    assert_same_proba(CompiledForest.compile(model), model, X)
+
+def test_matches_sklearn_on_more_rows_than_a_chunk(fitted):
+    model, X = fitted
+    rows = np.vstack([X] * 3)
+    assert rows.shape[0] > CompiledForest.CHUNK_ROWS
+    assert_same_proba(CompiledForest.compile(model), model, rows)
+
+def test_accepts_sparse_input(fitted):
+    model, X = fitted
+    compiled = CompiledForest.compile(model)
+    for a, e in zip(compiled.predict_proba(sparse.csr_matrix(X)), model.predict_proba(X)):
+        np.testing.assert_allclose(a, e, rtol=0, atol=1e-12)
+
+def test_single_row(fitted):
+    model, X = fitted
+    assert_same_proba(CompiledForest.compile(model), model, X[:1])
+
+def test_empty_input(fitted):
+    model, X = fitted
+    proba = CompiledForest.compile(model).predict_proba(X[:0])
+    assert len(proba) == len(model.estimators_)
+    assert all(p.shape == (0, 2) for p in proba)
+
+def test_save_and_load_round_trip(fitted, tmp_path):
+    model, X = fitted
+    compiled = CompiledForest.compile(model)
+    path = tmp_path / "forest.npz"
+    compiled.save(path)
+    loaded = CompiledForest.load(path)
+    assert loaded.depth == compiled.depth
+    for name in CompiledForest.ARRAYS:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(compiled, name))
+    assert_same_proba(loaded, model, X)
+
+def test_refuses_non_binary_forests():
+    X = np.random.default_rng(0).random((30, 4))
+    Y = np.column_stack([np.arange(30) % 3, np.arange(30) % 2])
+    model = MultiOutputClassifier(RandomForestClassifier(n_estimators=2, random_state=0)).fit(X, Y)
+    with pytest.raises(ValueError):
+        CompiledForest.compile(model)
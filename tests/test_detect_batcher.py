@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.detect_batcher import DetectBatcher
+
+class FakeDetector:
+    """Stands in for AllergenDetector, recording the batches it scores"""
+
+    def __init__(self, release: threading.Event = None):
+        self.batches = []
+        self.release = release
+
+    def detect_many(self, texts):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append(list(texts))
+        return [{"text": text} for text in texts]
+
+def test_concurrent_detections_are_scored_together():
+    async def scenario():
+        detector = FakeDetector()
+        batcher = DetectBatcher(detector, max_wait=0.05, max_size=10)
+        results = await asyncio.gather(*(batcher.detect(f"text {i}") for i in range(5)))
+        assert results == [{"text": f"text {i}"} for i in range(5)]
+        assert detector.batches == [[f"text {i}" for i in range(5)]]
+        assert batcher.stats()["batches"] == 1
+        await batcher.stop()
+
+    asyncio.run(scenario())
+
+def test_batches_are_capped_at_max_size():
+    async def scenario():
+        detector = FakeDetector()
+        batcher = DetectBatcher(detector, max_wait=0.05, max_size=2)
+        await asyncio.gather(*(batcher.detect(str(i)) for i in range(5)))
+        assert [len(batch) for batch in detector.batches] == [2, 2, 1]
+        await batcher.stop()
+
+    asyncio.run(scenario())
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    class BrokenDetector:
+        def detect_many(self, texts):
+            raise ValueError("model failed")
+
+    async def scenario():
+        batcher = DetectBatcher(BrokenDetector(), max_wait=0.01, max_size=10)
+        results = await asyncio.gather(batcher.detect("a"), batcher.detect("b"), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        await batcher.stop()
+
+    asyncio.run(scenario())
+
+def test_stop_fails_queued_and_running_detections():
+    async def scenario():
+        release = threading.Event()
+        batcher = DetectBatcher(FakeDetector(release), max_wait=0, max_size=1)
+        running = asyncio.ensure_future(batcher.detect("running"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(batcher.detect("queued"))
+        await asyncio.sleep(0)
+        await batcher.stop()
+        release.set()
+        for caller in (running, queued):
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(caller, 1)
+
+    asyncio.run(scenario())
+
+def test_detections_after_a_stop_start_a_new_worker():
+    async def scenario():
+        batcher = DetectBatcher(FakeDetector(), max_wait=0, max_size=10)
+        assert await batcher.detect("a") == {"text": "a"}
+        await batcher.stop()
+        assert await batcher.detect("b") == {"text": "b"}
+        await batcher.stop()
+
+    asyncio.run(scenario())
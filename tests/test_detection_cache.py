@@ -0,0 +1,77 @@
+import pytest
+
+from app.services import detection_cache as detection_cache_module
+from app.services.detection_cache import DetectionCache, normalize_text
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(detection_cache_module, "time", clock)
+    return clock
+
+def make_cache(**kwargs) -> DetectionCache:
+    options = {"max_entries": 3, "ttl": 60, "enabled": True}
+    options.update(kwargs)
+    return DetectionCache(**options)
+
+def put(cache, text, version="v1"):
+    key = cache.key(normalize_text(text), version)
+    cache.put(key, [0.9], text, {"text": text, "allergens": []})
+    return key
+
+def test_normalize_text():
+    assert normalize_text("  Milk,\tEGGS\n wheat ") == "milk, eggs wheat"
+
+def test_exact_and_normalized_hits(clock):
+    cache = make_cache()
+    key = put(cache, "Milk, eggs")
+    assert cache.get(key, "Milk, eggs").result["text"] == "Milk, eggs"
+    # Same normalized text, different spelling: model scores only
+    other = cache.get(cache.key(normalize_text("MILK,  EGGS"), "v1"), "MILK,  EGGS")
+    assert other.label_probs == [0.9] and other.text == "Milk, eggs"
+    stats = cache.stats()
+    assert (stats["hits"], stats["normalized_hits"], stats["misses"]) == (1, 1, 0)
+
+def test_version_is_part_of_the_key(clock):
+    cache = make_cache()
+    put(cache, "milk", version="v1")
+    assert cache.get(cache.key("milk", "v2"), "milk") is None
+    assert cache.stats()["misses"] == 1
+
+def test_evicts_least_recently_used(clock):
+    cache = make_cache()
+    keys = {text: put(cache, text) for text in ("a", "b", "c")}
+    assert cache.get(keys["a"], "a") is not None
+    keys["d"] = put(cache, "d")
+    assert cache.get(keys["b"], "b") is None
+    assert all(cache.get(keys[text], text) is not None for text in "acd")
+
+def test_entries_expire_after_ttl(clock):
+    cache = make_cache()
+    key = put(cache, "milk")
+    clock.now += 59
+    assert cache.get(key, "milk") is not None
+    clock.now += 1
+    assert cache.get(key, "milk") is None
+    assert cache.stats()["entries"] == 0
+
+def test_stored_result_is_a_copy(clock):
+    cache = make_cache()
+    result = {"allergens": [{"allergen": "dairy"}]}
+    key = cache.key("milk", "v1")
+    cache.put(key, [0.9], "milk", result)
+    result["allergens"][0]["is_user_allergen"] = True
+    assert cache.get(key, "milk").result == {"allergens": [{"allergen": "dairy"}]}
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = make_cache(enabled=False)
+    key = put(cache, "milk")
+    assert cache.get(key, "milk") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,51 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services import live_scan
+from app.services.live_scan import LiveScanSession
+
+class InlineExecutor:
+    """Runs pool work on the calling thread"""
+
+    async def run(self, fn, *args):
+        return fn(*args)
+
+def frame() -> bytes:
+    image = Image.new("L", (160, 120), 255)
+    ImageDraw.Draw(image).rectangle((20, 40, 60, 80), fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+
+    async def fake_extract_text_uncached(contents, dpi, language, profile):
+        calls.append(contents)
+        return {"text": "milk", "success": True}
+    monkeypatch.setattr(live_scan, "ocr_executor", InlineExecutor())
+    monkeypatch.setattr(live_scan, "extract_text_uncached", fake_extract_text_uncached)
+    return calls
+
+def test_detection_goes_through_the_given_detect(reads):
+    detected = []
+
+    async def detect(text):
+        detected.append(text)
+        return {"allergens": [{"allergen": "milk", "confidence": 0.9}]}
+
+    async def run():
+        session = LiveScanSession(detect, stable_frames=2)
+        first = await session.process(1, frame())
+        second = await session.process(2, frame())
+        return session, first, second
+
+    session, first, second = asyncio.run(run())
+    assert detected == ["milk"]
+    assert len(reads) == 1 and session.frames_skipped == 1
+    assert [event["event"] for event in first] == ["text"]
+    assert [event["event"] for event in second] == ["allergens"]
@@ -0,0 +1,35 @@
+from typing import Annotated
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.core.middleware import BodySizeLimitMiddleware
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=1000)
+
+    @app.post("/upload")
+    async def upload(file: Annotated[UploadFile, File()]):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+def test_small_upload_passes(client):
+    response = client.post("/upload", files={"file": ("a.png", b"x" * 100, "image/png")})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+def test_refuses_large_content_length(client):
+    response = client.post("/upload", files={"file": ("a.png", b"x" * 2000, "image/png")})
+    assert response.status_code == 413
+
+def test_cuts_off_chunked_body(client):
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 500
+
+    response = client.post("/upload", content=chunks(), headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
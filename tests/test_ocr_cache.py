@@ -0,0 +1,96 @@
+import pytest
+
+from app.services import ocr_cache as ocr_cache_module
+from app.services.ocr_cache import OCRResultCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ocr_cache_module, "time", clock)
+    return clock
+
+def make_cache(**kwargs) -> OCRResultCache:
+    options = {"max_entries": 3, "ttl": 60, "max_distance": 4, "enabled": True}
+    options.update(kwargs)
+    return OCRResultCache(**options)
+
+def test_exact_hit_and_miss(clock):
+    cache = make_cache()
+    cache.put("a", "params", {"text": "A"})
+    assert cache.get("a", "params") == {"text": "A"}
+    assert cache.get("a", "other params") is None
+    assert cache.get("b", "params") is None
+    assert cache.stats()["exact_hits"] == 1
+
+def test_evicts_least_recently_used(clock):
+    cache = make_cache()
+    for digest in "abc":
+        cache.put(digest, "params", {"text": digest})
+    # Touching "a" makes "b" the oldest
+    assert cache.get("a", "params") is not None
+    cache.put("d", "params", {"text": "d"})
+    assert cache.get("b", "params") is None
+    assert [cache.get(digest, "params")["text"] for digest in "acd"] == ["a", "c", "d"]
+    assert cache.stats()["entries"] == 3
+
+def test_entries_expire_after_ttl(clock):
+    cache = make_cache()
+    cache.put("a", "params", {"text": "A"})
+    clock.now += 59
+    assert cache.get("a", "params") is not None
+    clock.now += 1
+    assert cache.get("a", "params") is None
+    assert cache.stats()["entries"] == 0
+
+def test_refreshing_an_entry_resets_its_ttl(clock):
+    cache = make_cache()
+    cache.put("a", "params", {"text": "old"})
+    clock.now += 50
+    cache.put("a", "params", {"text": "new"})
+    clock.now += 50
+    assert cache.get("a", "params") == {"text": "new"}
+
+def test_perceptual_match_within_distance(clock):
+    cache = make_cache()
+    cache.put("a", "params", {"text": "A"}, size=(100, 80), phash=0b1111_0000)
+    # Three bits differ, one pixel of size slack
+    assert cache.get_similar((101, 80), 0b1111_0111, "params") == {"text": "A"}
+    assert cache.stats()["perceptual_hits"] == 1
+
+def test_perceptual_match_picks_the_closest(clock):
+    cache = make_cache()
+    cache.put("far", "params", {"text": "far"}, size=(100, 80), phash=0b0000_1111)
+    cache.put("near", "params", {"text": "near"}, size=(100, 80), phash=0b0000_0011)
+    assert cache.get_similar((100, 80), 0b0000_0001, "params") == {"text": "near"}
+
+@pytest.mark.parametrize("size, phash, params", [
+    ((100, 80), 0b1_1111, "params"),  # five bits away
+    ((103, 80), 0b0, "params"),  # different size
+    ((100, 80), 0b0, "other params")
+])
+def test_perceptual_miss(clock, size, phash, params):
+    cache = make_cache()
+    cache.put("a", "params", {"text": "A"}, size=(100, 80), phash=0b0)
+    assert cache.get_similar(size, phash, params) is None
+    assert cache.stats()["misses"] == 1
+
+def test_perceptual_match_skips_expired_entries(clock):
+    cache = make_cache()
+    cache.put("a", "params", {"text": "A"}, size=(100, 80), phash=0b0)
+    clock.now += 60
+    assert cache.get_similar((100, 80), 0b0, "params") is None
+    assert cache.stats()["entries"] == 0
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = make_cache(enabled=False)
+    cache.put("a", "params", {"text": "A"}, size=(100, 80), phash=0b0)
+    assert cache.get("a", "params") is None
+    assert cache.get_similar((100, 80), 0b0, "params") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,141 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.services import ocr_job_queue
+from app.services.ocr_job_queue import (
+    FAILED,
+    QUEUED,
+    SUCCEEDED,
+    InMemoryJobQueue,
+    QueueFullError,
+    SQLiteJobQueue,
+    run_worker
+)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_queue(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return InMemoryJobQueue(**kwargs)
+        return SQLiteJobQueue(str(tmp_path / "jobs.db"), **kwargs)
+    return make
+
+def test_claim_and_complete(make_queue):
+    queue = make_queue()
+    job = queue.submit(b"image", {"language": "eng"})
+    claimed = queue.claim("w1")
+    assert claimed.job.id == job.id and claimed.contents == b"image"
+    assert queue.claim("w2") is None
+    assert queue.complete(job.id, "w1", {"text": "milk"})
+    done = queue.get(job.id)
+    assert done.status == SUCCEEDED and done.result == {"text": "milk"}
+    assert queue.depth() == 0
+
+def test_queue_full(make_queue):
+    queue = make_queue(max_depth=1)
+    queue.submit(b"image", {})
+    with pytest.raises(QueueFullError):
+        queue.submit(b"image", {})
+
+def test_failed_attempts_are_retried_until_max(make_queue):
+    queue = make_queue(max_attempts=2)
+    job = queue.submit(b"image", {})
+    queue.claim("w1")
+    assert queue.fail(job.id, "w1", "boom")
+    assert queue.get(job.id).status == QUEUED
+    assert queue.claim("w1").job.attempts == 2
+    assert queue.fail(job.id, "w1", "boom")
+    assert queue.get(job.id).status == FAILED
+    assert queue.claim("w1") is None
+
+def test_expired_lease_cannot_overwrite_new_claimant(make_queue):
+    queue = make_queue(lease_seconds=-1)
+    job = queue.submit(b"image", {})
+    queue.claim("w1")
+    # w1's lease has run out, so w2 takes the job over
+    assert queue.claim("w2").job.attempts == 2
+    assert not queue.complete(job.id, "w1", {"text": "stale"})
+    assert not queue.fail(job.id, "w1", "stale")
+    assert queue.complete(job.id, "w2", {"text": "fresh"})
+    assert queue.get(job.id).result == {"text": "fresh"}
+
+def test_finished_job_cannot_be_reported_again(make_queue):
+    queue = make_queue()
+    job = queue.submit(b"image", {})
+    queue.claim("w1")
+    assert queue.complete(job.id, "w1", {"text": "milk"})
+    assert not queue.fail(job.id, "w1", "late")
+    assert queue.get(job.id).status == SUCCEEDED
+
+def test_deferred_job_waits_without_using_an_attempt(make_queue):
+    queue = make_queue(max_attempts=1, defer_seconds=60)
+    job = queue.submit(b"image", {})
+    queue.claim("w1")
+    assert queue.defer(job.id, "w1")
+    deferred = queue.get(job.id)
+    assert deferred.status == QUEUED and deferred.attempts == 0
+    # Held back until the delay has passed
+    assert queue.claim("w1") is None
+
+def test_deferred_job_runs_again_after_the_delay(make_queue):
+    queue = make_queue(max_attempts=1, defer_seconds=0)
+    job = queue.submit(b"image", {})
+    for _ in range(3):
+        queue.claim("w1")
+        assert queue.defer(job.id, "w1")
+    claimed = queue.claim("w1")
+    assert claimed.job.id == job.id and claimed.job.attempts == 1
+
+def test_only_the_lease_holder_can_defer(make_queue):
+    queue = make_queue()
+    job = queue.submit(b"image", {})
+    queue.claim("w1")
+    assert not queue.defer(job.id, "w2")
+
+def test_sqlite_queue_upgrades_an_old_file(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE ocr_jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, contents BLOB, "
+        "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, worker_id TEXT, lease_expires_at REAL, "
+        "expires_at REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.close()
+    queue = SQLiteJobQueue(path)
+    job = queue.submit(b"image", {})
+    assert queue.claim("w1").job.id == job.id
+
+def test_worker_survives_queue_errors(monkeypatch):
+    class FlakyQueue(InMemoryJobQueue):
+        failures = 2
+
+        def claim(self, worker_id):
+            if self.failures:
+                self.failures -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return super().claim(worker_id)
+
+        def purge_expired(self):
+            raise sqlite3.OperationalError("database is locked")
+
+    async def fake_extract_text(contents, **params):
+        return {"text": "milk", "success": True}
+    monkeypatch.setattr(ocr_job_queue, "extract_text", fake_extract_text)
+
+    queue = FlakyQueue()
+    job = queue.submit(b"image", {})
+
+    async def run():
+        stop = asyncio.Event()
+        worker = asyncio.create_task(run_worker(queue, "w1", stop, poll_interval=0.01))
+        for _ in range(100):
+            if queue.get(job.id).status == SUCCEEDED:
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await worker
+
+    asyncio.run(run())
+    assert queue.get(job.id).result == {"text": "milk", "success": True}
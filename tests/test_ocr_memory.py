@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from app.services.ocr_memory import MB, MemoryBudget, MemoryRecord, OCRBusyError
+
+def test_record_adds_up_overlapping_calls():
+    record = MemoryRecord([(1000, 1000)])
+    record.observe((0.0, 2.0, 100))
+    record.observe((1.0, 3.0, 50))  # overlaps the first
+    record.observe((4.0, 5.0, 120))  # runs alone
+    assert record.peak == 150
+
+def test_record_without_calls_has_no_peak():
+    assert MemoryRecord([(10, 10)]).peak == 0
+
+def test_budget_learns_from_the_request_peak():
+    budget = MemoryBudget(limit_bytes=100 * MB, bytes_per_pixel=1)
+    record = MemoryRecord([(1000, 1000)])
+    record.observe((0.0, 2.0, 3_000_000))
+    record.observe((1.0, 3.0, 3_000_000))
+    budget.learn(record)
+    assert budget.bytes_per_pixel == pytest.approx(6)
+
+def test_budget_refuses_after_waiting():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=10 * MB, wait_seconds=0.05, bytes_per_pixel=1)
+        async with budget.reserve(8 * MB):
+            with pytest.raises(OCRBusyError):
+                async with budget.reserve(8 * MB):
+                    pass
+        assert budget.stats()["rejected"] == 1
+        # Freed once the first request is done
+        async with budget.reserve(8 * MB):
+            assert budget.stats()["in_flight_mb"] == 8
+
+    asyncio.run(scenario())
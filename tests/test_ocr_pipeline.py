@@ -0,0 +1,58 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.ocr_pipeline import detect_text_regions, perceptual_hash, stitch_tile_texts
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("L", (width, height), 255).save(buffer, "PNG")
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("size", [(1, 1), (4, 4), (7, 200), (200, 3)])
+def test_perceptual_hash_of_tiny_images(size):
+    fingerprint = perceptual_hash(png(*size))
+    assert fingerprint is not None
+    assert fingerprint[0] == (size[1], size[0])
+
+def test_perceptual_hash_decodes_at_reduced_size():
+    (height, width), _ = perceptual_hash(png(800, 400))
+    assert (width, height) == (100, 50)
+
+def test_perceptual_hash_of_garbage():
+    assert perceptual_hash(b"not an image") is None
+
+def label() -> np.ndarray:
+    """A logo over a paragraph of small print whose last lines sit apart"""
+    image = np.full((1400, 1800), 255, np.uint8)
+    cv2.putText(image, "BRAND", (450, 220), cv2.FONT_HERSHEY_SIMPLEX, 7, 0, 25)
+    words = "wheat flour sugar palm oil candied pineapple yeast asafoetida salt milk powder soy lecithin".split()
+    y = 420
+    for i in range(14):
+        line = " ".join(words[(3 * i + k) % len(words)] for k in range(6))
+        cv2.putText(image, line, (140, y), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+        y += 80 if i == 10 else 46
+    return image
+
+def test_text_regions_cover_all_small_print():
+    image = label()
+    regions = detect_text_regions(image)
+    assert regions
+
+    covered = np.zeros(image.shape, bool)
+    for x, y, w, h in regions:
+        assert not covered[y:y + h, x:x + w].any()
+        covered[y:y + h, x:x + w] = True
+    print_ink = image[350:] < 128
+    assert not (print_ink & ~covered[350:]).any()
+    # The logo is left out
+    assert not covered[:200].any()
+
+def test_stitch_keeps_a_line_read_in_two_blocks_once():
+    texts = ["wheat flour, sugar, candied pineapple", "candied pineapple, yeast"]
+    boxes = [(0, 0, 100, 60), (0, 50, 100, 60)]
+    assert stitch_tile_texts(texts, boxes) == "wheat flour, sugar, candied pineapple yeast"
+    assert stitch_tile_texts(texts, [None, None]) == " ".join(texts)
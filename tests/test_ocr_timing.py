@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from app.services.ocr_timing import request_timing, stage, timed_call
+
+def stage_totals(timer):
+    return {name: seconds for name, (seconds, _) in timer.totals().items()}
+
+def test_nested_stages_record_exclusive_time():
+    with request_timing(enabled=True) as timer:
+        with stage("outer"):
+            time.sleep(0.02)
+            with stage("inner"):
+                time.sleep(0.05)
+    totals = stage_totals(timer)
+    assert 0.05 <= totals["inner"] < 0.07
+    assert 0.02 <= totals["outer"] < 0.04
+    # Stages don't add up to more than the request took
+    assert totals["outer"] + totals["inner"] <= totals["total"]
+
+def test_stages_timed_in_a_worker_are_left_out_of_the_caller():
+    def work():
+        with stage("worker"):
+            time.sleep(0.05)
+        return "done"
+
+    with request_timing(enabled=True) as timer:
+        with stage("outer"):
+            result, stages = timed_call(work)
+            timer.extend(stages)
+    assert result == "done"
+    totals = stage_totals(timer)
+    assert totals["worker"] >= 0.05
+    assert totals["outer"] < 0.02
+
+def test_parallel_nested_stages_leave_the_outer_stage_at_zero():
+    async def child():
+        with stage("child"):
+            await asyncio.sleep(0.05)
+
+    async def scan():
+        with request_timing(enabled=True) as timer:
+            with stage("outer"):
+                await asyncio.gather(child(), child())
+        return timer
+
+    totals = stage_totals(asyncio.run(scan()))
+    assert totals["child"] >= 0.1
+    assert totals["outer"] == 0.0
+
+def test_disabled_timing_records_nothing():
+    with request_timing(enabled=False) as timer:
+        with stage("outer"):
+            pass
+    assert timer is None
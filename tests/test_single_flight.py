@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+class Work:
+    """A computation the test releases by hand, counting how often it started"""
+
+    def __init__(self, result="done"):
+        self.result = result
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flights, work = SingleFlight(), Work()
+        callers = [asyncio.create_task(flights.run("key", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        work.release.set()
+        assert await asyncio.gather(*callers) == ["done"] * 5
+        assert work.calls == 1
+        assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+    asyncio.run(scenario())
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flights, a, b = SingleFlight(), Work("a"), Work("b")
+        callers = [asyncio.create_task(flights.run("a", a)), asyncio.create_task(flights.run("b", b))]
+        await asyncio.sleep(0)
+        a.release.set()
+        b.release.set()
+        assert await asyncio.gather(*callers) == ["a", "b"]
+        assert flights.stats()["started"] == 2
+
+    asyncio.run(scenario())
+
+def test_finished_key_runs_again():
+    async def scenario():
+        flights, work = SingleFlight(), Work()
+        work.release.set()
+        await flights.run("key", work)
+        await flights.run("key", work)
+        assert work.calls == 2
+
+    asyncio.run(scenario())
+
+def test_exception_reaches_every_caller():
+    async def scenario():
+        flights, work = SingleFlight(), Work(ValueError("bad image"))
+        callers = [asyncio.create_task(flights.run("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert work.calls == 1
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_one_cancelled_caller_leaves_the_run_for_the_others():
+    async def scenario():
+        flights, work = SingleFlight(), Work()
+        first = asyncio.create_task(flights.run("key", work))
+        second = asyncio.create_task(flights.run("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        work.release.set()
+        assert await second == "done"
+        assert first.cancelled()
+        assert not work.cancelled
+
+    asyncio.run(scenario())
+
+def test_run_is_cancelled_with_its_last_caller():
+    async def scenario():
+        flights, work = SingleFlight(), Work()
+        callers = [asyncio.create_task(flights.run("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert work.cancelled
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("result", ["done", ValueError("bad image")])
+def test_key_is_forgotten_once_done(result):
+    async def scenario():
+        flights, work = SingleFlight(), Work(result)
+        work.release.set()
+        try:
+            await flights.run("key", work)
+        except ValueError:
+            pass
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
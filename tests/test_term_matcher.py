@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from app.core.constants import INGREDIENTS
+from app.utils.term_matcher import TermMatcher, ingredient_matcher, lowercase
+
+def naive_labels(lexicon, text):
+    lowered = text.lower()
+    return {label for label, terms in lexicon.items() if any(term.lower() in lowered for term in terms)}
+
+def naive_matches(lexicon, text):
+    """Every (start, end, label) occurrence, by substring search"""
+    lowered = text.lower()
+    matches = set()
+    for label, terms in lexicon.items():
+        for term in terms:
+            term = term.lower()
+            start = lowered.find(term)
+            while start != -1:
+                matches.add((start, start + len(term), label))
+                start = lowered.find(term, start + 1)
+    return matches
+
+def test_matches_naive_substring_check_on_the_allergen_lexicon():
+    rng = random.Random(0)
+    terms = [term for group in INGREDIENTS.values() for term in group]
+    filler = ["water", "salt", "sugar", "natural flavour", ", ", " (", ")", "MAY CONTAIN", "and"]
+    for _ in range(300):
+        words = rng.choices(terms + filler, k=rng.randint(0, 12))
+        text = " ".join(word.upper() if rng.random() < 0.3 else word for word in words)
+        assert ingredient_matcher.labels_in(text) == naive_labels(INGREDIENTS, text), text
+
+def test_matches_naive_search_on_random_text():
+    rng = random.Random(1)
+    lexicon = {
+        "a": ["ab", "abc", "bca"],
+        "b": ["b", "cab"],
+        "c": ["aaa", "caca"]
+    }
+    matcher = TermMatcher(lexicon)
+    for _ in range(500):
+        text = "".join(rng.choices("abcAB ", k=rng.randint(0, 20)))
+        assert set(matcher.find(text)) == naive_matches(lexicon, text), text
+
+def test_reports_overlapping_and_nested_terms():
+    matcher = TermMatcher({"nut": ["nut", "peanut", "peanut butter"], "pea": ["pea"], "butter": ["butter"]})
+    assert sorted(matcher.find("Peanut Butter")) == [
+        (0, 3, "pea"),
+        (0, 6, "nut"),
+        (0, 13, "nut"),
+        (3, 6, "nut"),
+        (7, 13, "butter")
+    ]
+
+def test_reports_repeated_occurrences():
+    matcher = TermMatcher({"milk": ["milk"]})
+    assert list(matcher.find("milk, skimmed MILK")) == [(0, 4, "milk"), (14, 18, "milk")]
+
+def test_term_found_through_a_fail_link():
+    # "he" is only reached by falling back from the "she" branch
+    matcher = TermMatcher({"x": ["she", "he", "hers"]})
+    assert sorted(matcher.find("ushers")) == [(1, 4, "x"), (2, 4, "x"), (2, 6, "x")]
+
+def test_no_match():
+    assert list(TermMatcher({"milk": ["milk"]}).find("water, salt")) == []
+    assert list(TermMatcher({}).find("milk")) == []
+
+def test_offsets_survive_characters_lowercasing_to_two():
+    # "İ" lowercases to "i" plus a combining dot, shifting later offsets
+    assert lowercase("İx") == ("i̇x", [0, 0, 1])
+    assert lowercase("Milk") == ("milk", None)
+
+    text = "İngredients: MİLK, milk"
+    matcher = TermMatcher({"milk": ["milk"], "ingredients": ["i̇ngredients"]})
+    matches = sorted(matcher.find(text))
+    assert matches == [(0, 11, "ingredients"), (19, 23, "milk")]
+    assert [text[start:end] for start, end, _ in matches] == ["İngredients", "milk"]
+
+@pytest.mark.parametrize("text", ["İİ milk İ", "milk İ", "İmilk"])
+def test_offsets_point_at_the_term_in_the_original_text(text):
+    matcher = TermMatcher({"milk": ["milk"]})
+    assert [text[start:end] for start, end, _ in matcher.find(text)] == ["milk"]